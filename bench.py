@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""Benchmarks for the Python server (server.py).
+
+Usage:
+    python bench.py storage [--docs 2000]
+    python bench.py durability [--writers 8] [--writes 100]
+    python bench.py workers [--processes 1,2,4,8] [--clients 16] [--seconds 5]
+
+Every benchmark runs against throwaway data directories, never ./data.
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# Point the server module at a scratch data dir before it is imported
+_SCRATCH = tempfile.mkdtemp(prefix='crm-bench-')
+os.environ['DATA_DIR'] = os.path.join(_SCRATCH, 'default')
+os.environ.setdefault('STORAGE_BACKEND', 'json')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import server  # noqa: E402
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def make_backend(kind, root):
+    os.makedirs(root, exist_ok=True)
+    if kind == 'sqlite':
+        return server.SqliteBackend(os.path.join(root, 'bench.sqlite3'))
+    return server.JsonFileBackend(root)
+
+
+def storage_workload(backend, docs):
+    """Same workload for every backend; returns [(step, seconds, ops)]."""
+    results = []
+    convs = []
+    for i in range(docs):
+        phone = f'9198{i:08d}'
+        convs.append((phone, {
+            'phone': phone,
+            'leadId': f'lead_{i % (docs // 4 or 1)}',
+            'leadName': f'Lead {i}',
+            'status': 'open' if i % 3 else 'closed',
+            'messages': [{'id': f'msg_{i}_{m}', 'direction': 'incoming', 'text': f'message {m}',
+                          'timestamp': f'2026-01-01T00:00:{m:02d}Z'} for m in range(20)],
+            'createdAt': '2026-01-01T00:00:00Z',
+            'updatedAt': f'2026-01-01T00:{i % 60:02d}:00Z',
+        }))
+
+    def put_each():
+        for phone, doc in convs:
+            backend.put('conversations', phone, doc)
+    results.append(('put (one per call)', timed(put_each)[0], docs))
+
+    def put_batched():
+        for start in range(0, docs, 500):
+            backend.put_many('campaigns', [(k, d) for k, d in convs[start:start + 500]])
+    results.append(('put_many (batches of 500)', timed(put_batched)[0], docs))
+
+    def get_each():
+        for phone, _ in convs:
+            backend.get('conversations', phone)
+    results.append(('get by key', timed(get_each)[0], docs))
+
+    results.append(('list all', timed(lambda: sum(1 for _ in backend.list('conversations')))[0], docs))
+
+    lookups = min(docs, 200)
+
+    def find_lead():
+        for i in range(lookups):
+            list(backend.find('conversations', leadId=f'lead_{i}'))
+    results.append(('find by leadId', timed(find_lead)[0], lookups))
+
+    rows = [[f'Contact {i}', f'c{i}@example.com', f'9197{i:08d}', 'Acme'] for i in range(docs * 10)]
+    results.append(('rows_append', timed(lambda: backend.rows_append('contact-lists', 'bench', rows))[0], len(rows)))
+
+    def read_pages():
+        for start in range(0, len(rows), len(rows) // 10):
+            list(zip(range(100), backend.rows_iter('contact-lists', 'bench', start)))
+    results.append(('rows_iter (10 pages of 100)', timed(read_pages)[0], 10))
+    return results
+
+
+def bench_storage(args):
+    print(f'Storage backends, {args.docs} conversations of 20 messages each')
+    table = {}
+    for kind in ('json', 'sqlite'):
+        table[kind] = storage_workload(make_backend(kind, os.path.join(_SCRATCH, kind)), args.docs)
+    print(f"  {'step':<30}{'json ops/s':>14}{'sqlite ops/s':>14}")
+    for (step, json_secs, ops), (_, sqlite_secs, _) in zip(table['json'], table['sqlite']):
+        print(f'  {step:<30}{ops / json_secs:>14,.0f}{ops / sqlite_secs:>14,.0f}')
+
+
+def durability_workload(level, root, writers, writes):
+    """Concurrent writers hitting one store; returns (replace w/s, append w/s, fsync'd commits)."""
+    os.makedirs(root, exist_ok=True)
+    writer = server.DurableWriter(level)
+    backend = server.JsonFileBackend(root, writer=writer)
+
+    def run(fn):
+        threads = [threading.Thread(target=fn, args=(w,)) for w in range(writers)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return writers * writes / (time.perf_counter() - start)
+
+    def replace_worker(w):
+        for i in range(writes):
+            backend.put_singleton('message-log', [{'writer': w, 'seq': i, 'text': 'x' * 200}])
+
+    def append_worker(w):
+        for i in range(writes):
+            backend.rows_append('contact-lists', 'bench', [[f'Contact {w}-{i}', f'c{w}-{i}@example.com', '', '']])
+
+    replace_rate = run(replace_worker)
+    append_rate = run(append_worker)
+    return replace_rate, append_rate, writer.stats['commits']
+
+
+def bench_durability(args):
+    total = args.writers * args.writes
+    print(f'Durable writes, {args.writers} writer threads x {args.writes} writes to one store')
+    print(f"  {'level':<12}{'replace w/s':>14}{'append w/s':>14}{'commits':>10}{'writes':>10}")
+    for level in server.DURABILITY_LEVELS:
+        replace_rate, append_rate, commits = durability_workload(
+            level, os.path.join(_SCRATCH, 'durability-' + level), args.writers, args.writes)
+        print(f'  {level:<12}{replace_rate:>14,.0f}{append_rate:>14,.0f}{commits:>10}{total * 2:>10}')
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def http_call(port, method, path, body=None):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    try:
+        conn.request(method, path, body=json.dumps(body) if body is not None else None,
+                     headers={'Content-Type': 'application/json'})
+        resp = conn.getresponse()
+        return resp.status, resp.read()
+    finally:
+        conn.close()
+
+
+def start_server(data_dir, port, processes, backend):
+    env = dict(os.environ, DATA_DIR=data_dir, PORT=str(port), WORKER_PROCESSES=str(processes),
+               STORAGE_BACKEND=backend, SQLITE_PATH=os.path.join(data_dir, 'crm.sqlite3'))
+    proc = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'server.py')],
+                            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            http_call(port, 'GET', '/api/flows')
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError('server did not start')
+
+
+def seed_workers_data(port):
+    """A contact list and some conversations; returns the request mix."""
+    contacts = [{'name': f'Contact {i}', 'email': f'c{i}@example.com', 'phone': f'9197{i:08d}',
+                 'company': 'Acme'} for i in range(2000)]
+    status, body = http_call(port, 'POST', '/api/contact-lists', {'name': 'bench', 'contacts': contacts})
+    list_id = json.loads(body)['contactList']['id']
+    for i in range(200):
+        http_call(port, 'POST', '/api/messages/send', {'phone': f'9198{i:08d}', 'text': f'hello number {i}'})
+    return [f'/api/contact-lists/{list_id}?limit=1000',
+            '/api/conversations',
+            '/api/conversations/search?q=hello',
+            '/api/flows']
+
+
+def workers_client(port, paths, seconds, results):
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + seconds
+    i = 0
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            status, _ = http_call(port, 'GET', paths[i % len(paths)])
+            if status != 200:
+                errors += 1
+        except OSError:
+            errors += 1
+        latencies.append(time.perf_counter() - start)
+        i += 1
+    results.put((latencies, errors))
+
+
+def bench_workers(args):
+    counts = [int(n) for n in args.processes.split(',')]
+    data_dir = os.path.join(_SCRATCH, 'workers')
+    os.makedirs(data_dir, exist_ok=True)
+    print(f'Pre-fork throughput ({args.backend} storage), {args.clients} client processes x {args.seconds}s')
+    print('  mix: contact list page of 1000, conversation list, message search, flows')
+    print(f"  {'workers':<10}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}{'speedup':>9}")
+    baseline = None
+    paths = None
+    for processes in counts:
+        port = free_port()
+        proc = start_server(data_dir, port, processes, args.backend)
+        try:
+            if paths is None:
+                paths = seed_workers_data(port)
+            for path in paths:
+                http_call(port, 'GET', path)  # warm caches
+            results = multiprocessing.Queue()
+            clients = [multiprocessing.Process(target=workers_client, args=(port, paths, args.seconds, results))
+                       for _ in range(args.clients)]
+            for c in clients:
+                c.start()
+            samples = [results.get() for _ in clients]
+            for c in clients:
+                c.join()
+        finally:
+            proc.terminate()
+            proc.wait()
+        latencies = sorted(l for s, _ in samples for l in s)
+        errors = sum(e for _, e in samples)
+        rate = len(latencies) / args.seconds
+        baseline = baseline or rate
+        p50 = latencies[len(latencies) // 2] * 1000
+        p99 = latencies[int(len(latencies) * 0.99)] * 1000
+        print(f'  {processes:<10}{rate:>10,.0f}{p50:>10.1f}{p99:>10.1f}{errors:>8}{rate / baseline:>8.2f}x')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('storage', help='compare the JSON-file and SQLite backends')
+    p.add_argument('--docs', type=int, default=2000)
+    p.set_defaults(func=bench_storage)
+    p = sub.add_parser('durability', help='writes per second at each WRITE_DURABILITY level')
+    p.add_argument('--writers', type=int, default=8)
+    p.add_argument('--writes', type=int, default=100)
+    p.set_defaults(func=bench_durability)
+    p = sub.add_parser('workers', help='HTTP requests per second at each WORKER_PROCESSES count')
+    p.add_argument('--processes', default='1,2,4,8')
+    p.add_argument('--clients', type=int, default=16)
+    p.add_argument('--seconds', type=float, default=5)
+    p.add_argument('--backend', choices=('json', 'sqlite'), default='json')
+    p.set_defaults(func=bench_workers)
+    args = parser.parse_args()
+    try:
+        args.func(args)
+    finally:
+        shutil.rmtree(_SCRATCH, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -7,6 +7,10 @@ var WhatsAppChat = (function () {
   var currentPhone = null;
   var currentLeadId = null;
   var pollInterval = null;
+  var eventSource = null;
+  var currentMessages = [];
+  var hasOlder = false;
+  var loadingOlder = false;
 
   function loadConversation(leadId, phone) {
     currentLeadId = leadId;
@@ -21,11 +25,45 @@ var WhatsAppChat = (function () {
 
     fetchMessages(phone);
 
-    // Poll for new messages every 5 seconds
     stopPolling();
-    pollInterval = setInterval(function () {
+    if (typeof EventSource !== 'undefined') {
+      // Server pushes new messages and status changes for this chat
+      subscribe(phone);
+    } else {
+      // Poll for new messages every 5 seconds
+      pollInterval = setInterval(function () {
+        fetchMessages(phone);
+      }, 5000);
+    }
+  }
+
+  function subscribe(phone) {
+    var cleanPhone = phone.replace(/[^0-9+]/g, '');
+    eventSource = new EventSource('/api/conversations/stream?phone=' + encodeURIComponent(cleanPhone));
+
+    eventSource.addEventListener('message', function (e) {
+      var data = JSON.parse(e.data);
+      var exists = currentMessages.some(function (m) { return m.id === data.message.id; });
+      if (!exists) {
+        currentMessages.push(data.message);
+        renderMessages(currentMessages);
+      }
+    });
+
+    eventSource.addEventListener('status', function (e) {
+      var data = JSON.parse(e.data);
+      currentMessages.forEach(function (m) {
+        if (m.id === data.messageId || (data.waMessageId && m.waMessageId === data.waMessageId)) {
+          m.status = data.status;
+        }
+      });
+      renderMessages(currentMessages);
+    });
+
+    // Server lost our resume point (e.g. it restarted) — reload the chat
+    eventSource.addEventListener('reset', function () {
       fetchMessages(phone);
-    }, 5000);
+    });
   }
 
   async function fetchMessages(phone) {
@@ -36,17 +74,46 @@ var WhatsAppChat = (function () {
       var cleanPhone = phone.replace(/[^0-9+]/g, '');
       var res = await fetch('/api/conversations/phone/' + encodeURIComponent(cleanPhone));
       if (res.status === 404) {
+        currentMessages = [];
+        hasOlder = false;
         messagesEl.innerHTML = '<div class="wa-empty-hint">No WhatsApp messages yet. Send one below.</div>';
         return;
       }
       var data = await res.json();
-      renderMessages(data.conversation.messages || []);
+      currentMessages = data.conversation.messages || [];
+      hasOlder = !!(data.page && data.page.hasMore);
+      renderMessages(currentMessages);
     } catch (err) {
       messagesEl.innerHTML = '<div class="wa-empty-hint">Could not load messages.</div>';
     }
   }
 
-  function renderMessages(messages) {
+  // Fetch the page of history before the oldest message shown
+  async function loadOlder() {
+    if (!hasOlder || loadingOlder || !currentPhone || currentMessages.length === 0) return;
+    var messagesEl = document.getElementById('waChatMessages');
+    loadingOlder = true;
+    try {
+      var cleanPhone = currentPhone.replace(/[^0-9+]/g, '');
+      var res = await fetch('/api/conversations/phone/' + encodeURIComponent(cleanPhone) +
+        '?before=' + encodeURIComponent(currentMessages[0].id));
+      if (res.ok) {
+        var data = await res.json();
+        var older = data.conversation.messages || [];
+        hasOlder = !!(data.page && data.page.hasMore);
+        var previousHeight = messagesEl.scrollHeight;
+        currentMessages = older.concat(currentMessages);
+        renderMessages(currentMessages, true);
+        // Keep the message the user was looking at in place
+        messagesEl.scrollTop = messagesEl.scrollHeight - previousHeight;
+      }
+    } catch (err) {
+      console.error('Loading older messages failed:', err);
+    }
+    loadingOlder = false;
+  }
+
+  function renderMessages(messages, keepScroll) {
     var messagesEl = document.getElementById('waChatMessages');
     if (!messagesEl) return;
 
@@ -84,7 +151,7 @@ var WhatsAppChat = (function () {
       messagesEl.appendChild(bubble);
     });
 
-    messagesEl.scrollTop = messagesEl.scrollHeight;
+    if (!keepScroll) messagesEl.scrollTop = messagesEl.scrollHeight;
   }
 
   function getStatusIcon(status) {
@@ -123,7 +190,7 @@ var WhatsAppChat = (function () {
           leadId: currentLeadId
         })
       });
-      fetchMessages(currentPhone);
+      if (!eventSource) fetchMessages(currentPhone);
     } catch (err) {
       console.error('Send failed:', err);
     }
@@ -137,6 +204,10 @@ var WhatsAppChat = (function () {
       clearInterval(pollInterval);
       pollInterval = null;
     }
+    if (eventSource) {
+      eventSource.close();
+      eventSource = null;
+    }
   }
 
   function hide() {
@@ -152,6 +223,11 @@ var WhatsAppChat = (function () {
     var sendBtn = document.getElementById('btnWaSend');
     if (sendBtn) sendBtn.addEventListener('click', sendMessage);
 
+    var messagesEl = document.getElementById('waChatMessages');
+    if (messagesEl) messagesEl.addEventListener('scroll', function () {
+      if (messagesEl.scrollTop === 0) loadOlder();
+    });
+
     var chatInput = document.getElementById('waChatInput');
     if (chatInput) chatInput.addEventListener('keypress', function (e) {
       if (e.key === 'Enter') sendMessage();
@@ -1,15 +1,42 @@
 #!/usr/bin/env python3
 """Sales Dashboard + WhatsApp Marketing Platform Server."""
+import atexit
+import base64
+import codecs
+import collections
+import csv
+import hashlib
+import heapq
+import hmac
+import html
+import http.client
 import http.server
+import io
+import itertools
 import json
+import math
+import multiprocessing
 import os
+import re
+import signal
+import socket
+import sqlite3
+import sys
+import threading
 import uuid
+import zlib
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking of the change log
+    fcntl = None
 import urllib.request
 import urllib.error
 import time
 import logging
-from datetime import datetime
-from urllib.parse import urlparse, parse_qs
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from array import array
+from urllib.parse import urlparse, parse_qs, urlencode
 
 # ─── Load .env file if present ────────────────────────────────
 ENV_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
@@ -26,15 +53,23 @@ if os.path.exists(ENV_FILE):
                 os.environ.setdefault(key, val)
 
 PORT = int(os.environ.get('PORT', 8080))
+# Pre-fork serving: number of worker processes accepting on the port (1 = a
+# single process, the default). A supervisor restarts workers that die.
+WORKER_PROCESSES = int(os.environ.get('WORKER_PROCESSES', 1))
 API_URL = 'https://linkedin-ads-dashboard.vercel.app/api/linkedin/leads?accountId=517988166&limit=500'
-DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
-FLOWS_DIR = os.path.join(DATA_DIR, 'flows')
-CONVS_DIR = os.path.join(DATA_DIR, 'conversations')
-CAMPAIGNS_DIR = os.path.join(DATA_DIR, 'campaigns')
-TEMPLATES_DIR = os.path.join(DATA_DIR, 'templates')
-CONTACTLISTS_DIR = os.path.join(DATA_DIR, 'contact-lists')
-TRACKING_FILE = os.path.join(DATA_DIR, 'email-tracking.json')
-MSG_LOG_FILE = os.path.join(DATA_DIR, 'message-log.json')
+DATA_DIR = os.environ.get('DATA_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+# Storage backend: 'json' (one file per record under DATA_DIR, the default)
+# or 'sqlite' (single WAL-mode database at SQLITE_PATH)
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'json')
+SQLITE_PATH = os.environ.get('SQLITE_PATH') or os.path.join(DATA_DIR, 'crm.sqlite3')
+
+# Write durability: 'none' (atomic rename, no fsync), 'batched' (group commit —
+# concurrent writes to the same file share one fsync; the default) or
+# 'per-write' (fsync every write). GROUP_COMMIT_WINDOW_MS lets a batch wait a
+# little longer for more writes to join it.
+WRITE_DURABILITY = os.environ.get('WRITE_DURABILITY', 'batched')
+GROUP_COMMIT_WINDOW_MS = float(os.environ.get('GROUP_COMMIT_WINDOW_MS', 0))
 
 # WhatsApp Cloud API config — Single Koenig Solutions Brand Account
 # All messages are sent from the single Koenig WhatsApp Business number
@@ -45,6 +80,64 @@ WA_VERIFY_TOKEN = os.environ.get('WHATSAPP_VERIFY_TOKEN', 'sales_dashboard_verif
 WA_API_VERSION = os.environ.get('WA_API_VERSION', 'v21.0')
 WA_BRAND_NAME = os.environ.get('WA_BRAND_NAME', 'Koenig Solutions')
 
+# Outbound WhatsApp queue — WA_SEND_MODE=async makes /api/messages/send queue
+# by default (a request can also pass "async": true/false). Queued messages
+# are retried with exponential backoff, surviving restarts, up to
+# OUTBOX_MAX_ATTEMPTS sends.
+WA_SEND_MODE = os.environ.get('WA_SEND_MODE', 'sync')
+OUTBOX_WORKERS = int(os.environ.get('OUTBOX_WORKERS', 2))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', 6))
+OUTBOX_RETRY_BASE_SECONDS = 2
+OUTBOX_RETRY_MAX_SECONDS = 300
+# How long a worker's claim on an item it is sending holds off the others
+OUTBOX_CLAIM_SECONDS = 60
+
+# WhatsApp broadcasts — sends per second across all broadcasts (the Graph API
+# throughput limit of the business number) and concurrent senders per broadcast
+BROADCAST_RATE_PER_SECOND = float(os.environ.get('BROADCAST_RATE_PER_SECOND', 20))
+BROADCAST_WORKERS = int(os.environ.get('BROADCAST_WORKERS', 4))
+
+# Contact import — rows are validated and written in batches of this size
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 500))
+IMPORT_MAX_ERROR_ROWS = 100
+# What an import does with a row whose phone/email already exists:
+#   merge  — fill the existing lead's empty fields (default)
+#   update — overwrite the existing lead's fields with the row's values
+#   skip   — ignore the row
+#   create — always create a new lead (pre-dedupe behaviour)
+IMPORT_DEDUPE_POLICIES = ('merge', 'update', 'skip', 'create')
+
+# Email open/click tracking — counters are kept in memory and flushed to
+# email-tracking.json every TRACKING_FLUSH_INTERVAL seconds or after
+# TRACKING_FLUSH_EVERY events, whichever comes first.
+TRACKING_FLUSH_INTERVAL = float(os.environ.get('TRACKING_FLUSH_INTERVAL', 5))
+TRACKING_FLUSH_EVERY = int(os.environ.get('TRACKING_FLUSH_EVERY', 200))
+# Tracking links are signed (HMAC of campaign, recipient and target URL), so
+# the click redirect only goes where a campaign email pointed and made-up
+# campaign ids are not counted. Without TRACKING_SECRET a key is generated
+# into data/tracking-secret on first start.
+TRACKING_SECRET = os.environ.get('TRACKING_SECRET', '')
+
+# Messaging analytics — send/delivery rollups are kept in memory and
+# flushed on the same write-behind schedule as email tracking
+ANALYTICS_FLUSH_INTERVAL = float(os.environ.get('ANALYTICS_FLUSH_INTERVAL', TRACKING_FLUSH_INTERVAL))
+
+# Conversation archive — conversations not updated for ARCHIVE_IDLE_DAYS are
+# compressed into data/archive/ segments (closed at ARCHIVE_SEGMENT_MAX_BYTES)
+# and restored when looked up or messaged. The job runs at startup and every
+# ARCHIVE_INTERVAL_HOURS (0 = only on POST /api/conversations/archive/run).
+ARCHIVE_IDLE_DAYS = float(os.environ.get('ARCHIVE_IDLE_DAYS', 90))
+ARCHIVE_INTERVAL_HOURS = float(os.environ.get('ARCHIVE_INTERVAL_HOURS', 24))
+ARCHIVE_SEGMENT_MAX_BYTES = int(os.environ.get('ARCHIVE_SEGMENT_MAX_BYTES', 64 * 1024 * 1024))
+
+# Lead analytics — the static lead rows the dashboard ships with
+STATIC_LEADS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'leads-data.json')
+
+# Server-Sent Events — heartbeat interval and how many recent events are
+# kept for Last-Event-ID resume
+SSE_HEARTBEAT_SECONDS = float(os.environ.get('SSE_HEARTBEAT_SECONDS', 15))
+SSE_REPLAY_BUFFER = int(os.environ.get('SSE_REPLAY_BUFFER', 2000))
+
 # Logging setup
 logging.basicConfig(
     level=logging.INFO,
@@ -53,35 +146,1268 @@ logging.basicConfig(
 )
 logger = logging.getLogger('wa-server')
 
-# Ensure data directories exist
-os.makedirs(FLOWS_DIR, exist_ok=True)
-os.makedirs(CONVS_DIR, exist_ok=True)
-os.makedirs(CAMPAIGNS_DIR, exist_ok=True)
-os.makedirs(TEMPLATES_DIR, exist_ok=True)
-os.makedirs(CONTACTLISTS_DIR, exist_ok=True)
+# ─── Durable Writes ─────────────────────────────────────────────
+DURABILITY_LEVELS = ('none', 'batched', 'per-write')
+
+
+class _CommitGroup:
+    """Writes to one file waiting to be committed together."""
+
+    def __init__(self):
+        self.replace = None
+        self.appends = []
+        self.done = threading.Event()
+        self.error = None
+
+
+class DurableWriter:
+    """Crash-safe file writes shared by every JSON-file store.
+
+    A replace writes a temp file and renames it over the target, so readers
+    and crashes only ever see the old or the new content, never a truncated
+    file. Appends are written with a single write() call. With 'batched'
+    durability the first writer for a file becomes the committer: every write
+    to that file that arrives while it is busy joins the next group, and one
+    fsync covers the whole group. Callers return once their write is durable.
+    """
+
+    def __init__(self, durability='batched', window_ms=0):
+        if durability not in DURABILITY_LEVELS:
+            raise ValueError(f'durability must be one of {DURABILITY_LEVELS}')
+        self.durability = durability
+        self.window = window_ms / 1000.0
+        self.fsync = durability != 'none'
+        self.lock = threading.Lock()
+        self.files = {}
+        self.stats = {'writes': 0, 'commits': 0}
+
+    def replace(self, path, data):
+        self._submit(path, data, is_append=False)
+
+    def append(self, path, data):
+        self._submit(path, data, is_append=True)
+
+    def replace_many(self, files):
+        """Replace several files at once: each is written and synced, then all
+        are renamed into place and every directory involved is synced once."""
+        renames = []
+        try:
+            for path, data in files:
+                tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                    if self.fsync:
+                        f.flush()
+                        os.fsync(f.fileno())
+                renames.append((tmp_path, path))
+            for tmp_path, path in renames:
+                os.replace(tmp_path, path)
+        except BaseException:
+            for tmp_path, _ in renames:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            raise
+        if self.fsync:
+            for directory in {os.path.dirname(path) for _, path in renames}:
+                _fsync_dir(directory)
+        with self.lock:
+            self.stats['writes'] += len(renames)
+            self.stats['commits'] += 1
+
+    def _submit(self, path, data, is_append):
+        with self.lock:
+            state = self.files.setdefault(path, {'pending': None, 'busy': False, 'lock': threading.Lock()})
+            self.stats['writes'] += 1
+            if self.durability != 'batched':
+                group = _CommitGroup()
+                leader = False
+            else:
+                group = state['pending']
+                if group is None:
+                    group = state['pending'] = _CommitGroup()
+                leader = not state['busy']
+                if leader:
+                    state['busy'] = True
+            if is_append:
+                group.appends.append(data)
+            else:
+                # A replace supersedes anything queued before it
+                group.replace = data
+                group.appends = []
+
+        if self.durability != 'batched':
+            with state['lock']:
+                self._commit(path, group)
+        elif leader:
+            self._lead(path, state)
+        group.done.wait()
+        if group.error:
+            raise group.error
+
+    def _lead(self, path, state):
+        while True:
+            if self.window:
+                time.sleep(self.window)
+            with self.lock:
+                group, state['pending'] = state['pending'], None
+                if group is None:
+                    state['busy'] = False
+                    return
+            self._commit(path, group)
+
+    def _commit(self, path, group):
+        try:
+            directory = os.path.dirname(path)
+            if group.replace is not None:
+                tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+                with open(tmp_path, 'wb') as f:
+                    f.write(group.replace)
+                    f.write(b''.join(group.appends))
+                    if self.fsync:
+                        f.flush()
+                        os.fsync(f.fileno())
+                os.replace(tmp_path, path)
+                if self.fsync:
+                    _fsync_dir(directory)
+            else:
+                created = not os.path.exists(path)
+                with open(path, 'ab') as f:
+                    f.write(b''.join(group.appends))
+                    if self.fsync:
+                        f.flush()
+                        os.fsync(f.fileno())
+                if created and self.fsync:
+                    _fsync_dir(directory)
+            with self.lock:
+                self.stats['commits'] += 1
+        except Exception as e:
+            group.error = e
+        finally:
+            group.done.set()
+
+
+def _fsync_dir(directory):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+if WRITE_DURABILITY not in DURABILITY_LEVELS:
+    logger.warning(f'Unknown WRITE_DURABILITY {WRITE_DURABILITY!r}, using batched')
+    WRITE_DURABILITY = 'batched'
+durable_writer = DurableWriter(WRITE_DURABILITY, GROUP_COMMIT_WINDOW_MS)
+
+
+# ─── Worker Processes ─────────────────────────────────────────
+# With WORKER_PROCESSES > 1 the listening socket is opened once and shared by
+# forked workers. Workers keep their own in-memory caches; they stay coherent
+# through `shared` (version counters in shared memory that a cache compares
+# before use) and `bus` (datagrams to the sibling workers, for live events).
+LOCK_DIR = os.path.join(DATA_DIR, '.locks')
+WORKER_RESTART_DELAY = 1.0
+
+
+class InterProcessLock:
+    """Re-entrant lock that also excludes other processes (flock on a lock file).
+
+    The file is opened per process, since a flock taken through a descriptor
+    inherited across fork would be shared with the parent.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.RLock()
+        self.depth = 0
+        self.fd = None
+        self.pid = None
+
+    def __enter__(self):
+        self.lock.acquire()
+        if self.depth == 0 and fcntl:
+            try:
+                if self.pid != os.getpid():
+                    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                    self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                    self.pid = os.getpid()
+                fcntl.flock(self.fd, fcntl.LOCK_EX)
+            except BaseException:
+                self.lock.release()
+                raise
+        self.depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self.depth -= 1
+        if self.depth == 0 and fcntl:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+        self.lock.release()
+
+
+def try_process_lock(name):
+    """Take data/.locks/<name>.lock without waiting; returns the fd to close to
+    release it, or None while another holder (in any process) has it."""
+    if not fcntl:
+        return -1
+    os.makedirs(LOCK_DIR, exist_ok=True)
+    fd = os.open(os.path.join(LOCK_DIR, f'{name}.lock'), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return None
+    return fd
+
+def release_process_lock(fd):
+    if fd is not None and fd >= 0:
+        os.close(fd)
+
+
+class SharedCounters:
+    """Named int64 counters visible to every worker process.
+
+    They are plain per-process values until share() moves them into shared
+    memory, which the supervisor does before forking.
+    """
+
+    def __init__(self, names):
+        self.slots = {name: i for i, name in enumerate(names)}
+        self.values = [0] * len(names)
+        self.lock = threading.RLock()
+
+    def share(self):
+        values = multiprocessing.RawArray('q', len(self.values))
+        values[:] = self.values
+        self.values = values
+        self.lock = multiprocessing.RLock()
+
+    def get(self, name):
+        return self.values[self.slots[name]]
+
+    def set(self, name, value):
+        self.values[self.slots[name]] = value
+
+    def bump(self, name):
+        with self.lock:
+            value = self.values[self.slots[name]] + 1
+            self.values[self.slots[name]] = value
+            return value
+
+
+shared = SharedCounters(('contact-index', 'contact-index-rebuild', 'message-index', 'message-index-rebuild',
+                         'email-tracking', 'messaging-analytics', 'conv-events', 'wa-send-slot',
+                         'conv-archive'))
+
+
+class WorkerBus:
+    """Datagram sockets connecting the worker processes.
+
+    The supervisor creates one socket pair per worker slot before forking;
+    each worker reads its own inbox on a background thread and publish()
+    sends a JSON [topic, payload] datagram to every other worker. Sends never
+    block: a datagram for a worker that is not reading is dropped.
+    """
+
+    MAX_DATAGRAM = 1 << 20
+
+    def __init__(self):
+        self.pairs = []
+        self.inbox = None
+        self.peers = []
+        self.handlers = {}
+
+    def open(self, count):
+        self.pairs = [socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM) for _ in range(count)]
+        for _, sender in self.pairs:
+            sender.setblocking(False)
+
+    def attach(self, slot):
+        self.inbox = self.pairs[slot][0]
+        self.peers = [sender for i, (_, sender) in enumerate(self.pairs) if i != slot]
+        threading.Thread(target=self._run, name='worker-bus', daemon=True).start()
+
+    def subscribe(self, topic, handler):
+        self.handlers[topic] = handler
+
+    def publish(self, topic, payload):
+        if not self.peers:
+            return
+        data = json.dumps([topic, payload], separators=(',', ':')).encode()
+        for peer in self.peers:
+            try:
+                peer.send(data)
+            except OSError as e:
+                logger.warning(f'Worker bus: dropped {topic} message: {e}')
+
+    def _run(self):
+        while True:
+            try:
+                topic, payload = json.loads(self.inbox.recv(self.MAX_DATAGRAM))
+                handler = self.handlers.get(topic)
+                if handler:
+                    handler(payload)
+            except Exception as e:
+                logger.error(f'Worker bus: {e}')
+
+
+bus = WorkerBus()
+
+
+def _describe_exit(pid, status):
+    if os.WIFSIGNALED(status):
+        return f'worker {pid} killed by signal {os.WTERMSIG(status)}'
+    return f'worker {pid} exited with status {os.WEXITSTATUS(status)}'
+
+def run_worker_processes(httpd, count):
+    """Fork `count` workers and supervise them; returns only in a worker, with its slot.
+
+    Call with httpd's listening socket open (workers inherit it) and no
+    threads started. The supervisor restarts any worker that dies, forwards
+    SIGTERM/SIGINT to the workers and exits once they are all gone.
+    """
+    # Every worker wakes for a new connection; those that lose the race to
+    # accept it go back to waiting instead of blocking in accept()
+    httpd.socket.setblocking(False)
+    shared.share()
+    bus.open(count)
+    share_record_locks()
+    children = {}
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+
+    def spawn(slot):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+            bus.attach(slot)
+            return True
+        children[pid] = (slot, time.monotonic())
+        return False
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for slot in range(count):
+        if spawn(slot):
+            return slot
+    logger.info(f'Supervisor {os.getpid()}: {count} worker processes started')
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        slot, started = children.pop(pid, (None, 0))
+        if slot is None or stopping:
+            continue
+        logger.error(f'{_describe_exit(pid, status)}, restarting')
+        if time.monotonic() - started < WORKER_RESTART_DELAY:
+            # Dying right after start: don't spin
+            time.sleep(WORKER_RESTART_DELAY)
+            if stopping:
+                continue
+        if spawn(slot):
+            return slot
+    sys.exit(0)
+
+
+# ─── Storage Backends ───────────────────────────────────────────
+# Every store below goes through `storage`, one of:
+#   JsonFileBackend — one JSON file per document under data/<collection>/
+#   SqliteBackend   — a single SQLite database in WAL mode
+# selected with STORAGE_BACKEND=json|sqlite. Besides keyed documents a
+# backend holds append-only row streams (contact list members, conversation
+# messages, indexes) and
+# a few singleton documents (tracking counters, message log).
+
+# Document fields copied into indexed SQLite columns
+INDEXED_FIELDS = {'phone': 'phone', 'leadId': 'lead_id', 'status': 'status',
+                  'createdAt': 'created_at', 'updatedAt': 'updated_at'}
+DOC_COLLECTIONS = ('flows', 'conversations', 'campaigns', 'templates',
+                   'contact-lists', 'import-jobs', 'leads', 'outbox', 'broadcasts')
+ROW_COLLECTIONS = ('contact-lists', 'messages', 'indexes', 'broadcast-results')
+SINGLETONS = ('email-tracking', 'email-tracking-recipients', 'message-log', 'messaging-analytics',
+              'conversation-archive')
+# Collections whose writes bump the change sequence used for delta sync
+CHANGE_TRACKED = ('flows', 'conversations', 'campaigns', 'templates', 'contact-lists', 'leads')
+# The JSON change log is rewritten with only the latest entry per record once
+# it has this many lines and at least half of them are superseded
+CHANGE_LOG_COMPACT_LINES = 100000
+
+
+class StorageBackend:
+    """Interface implemented by the storage backends."""
+
+    name = ''
+
+    def get(self, collection, key):
+        raise NotImplementedError
+
+    def put(self, collection, key, doc):
+        raise NotImplementedError
+
+    def put_many(self, collection, docs):
+        """Write several (key, doc) pairs in one transaction."""
+        with self.transaction():
+            for key, doc in docs:
+                self.put(collection, key, doc)
+
+    def delete(self, collection, key):
+        raise NotImplementedError
+
+    def keys(self, collection):
+        raise NotImplementedError
+
+    def list(self, collection):
+        for key in self.keys(collection):
+            doc = self.get(collection, key)
+            if doc is not None:
+                yield doc
+
+    def find(self, collection, **filters):
+        """Yield documents whose top-level fields equal every filter value."""
+        for doc in self.list(collection):
+            if all(doc.get(k) == v for k, v in filters.items()):
+                yield doc
+
+    def rows_append(self, collection, key, rows):
+        raise NotImplementedError
+
+    def rows_iter(self, collection, key, start=0):
+        raise NotImplementedError
+
+    def rows_iter_reverse(self, collection, key):
+        """Yield a row stream newest first."""
+        return reversed(list(self.rows_iter(collection, key)))
+
+    def rows_read_from(self, collection, key, cursor=0):
+        """Return (rows appended after cursor, new cursor); cursor 0 is the start."""
+        rows = list(self.rows_iter(collection, key, cursor))
+        return rows, cursor + len(rows)
+
+    def rows_replace(self, collection, key, rows):
+        raise NotImplementedError
+
+    def rows_delete(self, collection, key):
+        raise NotImplementedError
+
+    def row_keys(self, collection):
+        raise NotImplementedError
+
+    def get_singleton(self, name, default=None):
+        raise NotImplementedError
+
+    def put_singleton(self, name, data):
+        raise NotImplementedError
+
+    def change_seq(self):
+        """Current value of the monotonically increasing change sequence."""
+        raise NotImplementedError
+
+    def changes_since(self, collection, since):
+        """Return (upserted keys, deleted keys, current seq) for changes after since."""
+        raise NotImplementedError
+
+    def touch(self, collection, keys):
+        """Record keys as upserted in the change sequence without writing them,
+        for records whose derived data (e.g. tracking counts) changed."""
+        raise NotImplementedError
+
+    @contextmanager
+    def transaction(self):
+        yield
+
+    @contextmanager
+    def exclusive(self, name):
+        """Hold a named lock across worker processes, for read-merge-write of a singleton."""
+        with self.transaction():
+            yield
+
+    @contextmanager
+    def batch(self):
+        """Coalesce the calling thread's document writes and persist them together on exit."""
+        with self.transaction():
+            yield
+
+    def checkpoint(self):
+        """Persist what the calling thread's open batch has written so far; the batch stays open."""
+
+
+class _ChangeLog:
+    """Change sequence for JsonFileBackend: an append-only log of
+    [seq, collection, key, op] lines, of which only the latest entry per
+    record is kept in memory. Appends hold an exclusive flock on a sidecar
+    lock file and first read anything other processes appended, so the
+    sequence stays monotonic when several server processes share one data
+    directory. Once superseded lines dominate, the log is rewritten with the
+    latest entry per record; readers notice the new file and re-read it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file_lock = InterProcessLock(path + '.lock')
+        self.latest = {}
+        self.seq = 0
+        self.size = 0
+        self.lines = 0
+        self.inode = None
+
+    def _catch_up(self):
+        # Called with self.lock held
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            return
+        with f:
+            inode = os.fstat(f.fileno()).st_ino
+            if inode != self.inode:
+                # First read, or another process compacted the log
+                self.latest, self.size, self.lines, self.inode = {}, 0, 0, inode
+            f.seek(self.size)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # another process is mid-append
+                seq, collection, key, op = json.loads(line)
+                self.latest[(collection, key)] = (seq, op)
+                self.seq = max(self.seq, seq)
+                self.size += len(line)
+                self.lines += 1
+
+    def record(self, collection, keys, op):
+        with self.lock, self.file_lock:
+            self._catch_up()
+            lines = []
+            for key in keys:
+                self.seq += 1
+                self.latest[(collection, key)] = (self.seq, op)
+                lines.append(json.dumps([self.seq, collection, key, op], separators=(',', ':')) + '\n')
+            data = ''.join(lines).encode()
+            with open(self.path, 'ab') as f:
+                f.write(data)
+                f.flush()
+                if self.inode is None:
+                    self.inode = os.fstat(f.fileno()).st_ino
+            self.size += len(data)
+            self.lines += len(lines)
+            if self.lines > max(CHANGE_LOG_COMPACT_LINES, 2 * len(self.latest)):
+                self._compact()
+
+    def _compact(self):
+        # Called with both locks held
+        entries = sorted((seq, collection, key, op) for (collection, key), (seq, op) in self.latest.items())
+        data = ''.join(json.dumps(list(e), separators=(',', ':')) + '\n' for e in entries).encode()
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+            inode = os.fstat(f.fileno()).st_ino
+        os.replace(tmp_path, self.path)
+        logger.info(f'Compacted change log: {self.lines} -> {len(entries)} entries')
+        self.size, self.lines, self.inode = len(data), len(entries), inode
+
+    def current(self):
+        with self.lock:
+            self._catch_up()
+            return self.seq
+
+    def since(self, collection, since):
+        with self.lock:
+            self._catch_up()
+            changed = sorted((seq, key, op) for (c, key), (seq, op) in self.latest.items()
+                             if c == collection and seq > since)
+            seq = self.seq
+        upserted = [key for _, key, op in changed if op == 'upsert']
+        deleted = [key for _, key, op in changed if op == 'delete']
+        return upserted, deleted, seq
+
+
+class _AppendLogCollection:
+    """A collection kept as one NDJSON file; a put appends a new version.
+
+    The byte offset of each document's latest version is kept in memory, so
+    reads are a single seek. Used by JsonFileBackend for 'leads', where one
+    file per document would mean hundreds of thousands of files. Writers
+    hold a flock on a sidecar lock file and every access first reads what
+    other processes appended, so worker processes can share the file.
+    """
+
+    def __init__(self, path, writer):
+        self.path = path
+        self.writer = writer
+        self.lock = threading.Lock()
+        self.file_lock = InterProcessLock(path + '.lock')
+        self.offsets = None
+        self.size = 0
+
+    def _offsets(self):
+        # Called with self.lock held
+        if self.offsets is None:
+            self.offsets = {}
+            self.size = 0
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            size = 0
+        if size > self.size:
+            with open(self.path, 'rb') as f:
+                f.seek(self.size)
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break  # another process is mid-append
+                    if line.strip():
+                        doc = json.loads(line)
+                        if doc.get('_deleted'):
+                            self.offsets.pop(doc.get('id'), None)
+                        else:
+                            self.offsets[doc.get('id')] = self.size
+                    self.size += len(line)
+        return self.offsets
+
+    def get(self, key):
+        with self.lock:
+            offset = self._offsets().get(key)
+            if offset is None:
+                return None
+            with open(self.path, 'rb') as f:
+                f.seek(offset)
+                return json.loads(f.readline())
+
+    def put_many(self, docs):
+        with self.lock, self.file_lock:
+            offsets = self._offsets()
+            chunks = []
+            new_offsets = {}
+            size = self.size
+            for key, doc in docs:
+                line = json.dumps(doc, separators=(',', ':')).encode() + b'\n'
+                new_offsets[key] = size
+                size += len(line)
+                chunks.append(line)
+            self.writer.append(self.path, b''.join(chunks))
+            offsets.update(new_offsets)
+            self.size = size
+
+    def delete(self, key):
+        with self.lock, self.file_lock:
+            offsets = self._offsets()
+            if key not in offsets:
+                return False
+            line = json.dumps({'id': key, '_deleted': True}).encode() + b'\n'
+            self.writer.append(self.path, line)
+            del offsets[key]
+            self.size += len(line)
+            return True
+
+    def keys(self):
+        with self.lock:
+            return list(self._offsets())
+
+    def list(self):
+        if not os.path.exists(self.path):
+            return
+        with self.lock:
+            offsets = dict(self._offsets())
+        with open(self.path, 'rb') as f:
+            offset = 0
+            for line in f:
+                if line.strip():
+                    doc = json.loads(line)
+                    if offsets.get(doc.get('id')) == offset:
+                        yield doc
+                offset += len(line)
+
+
+class JsonFileBackend(StorageBackend):
+    """The original layout: data/<collection>/<key>.json plus sidecar files."""
+
+    name = 'json'
+
+    def __init__(self, root, writer=None):
+        self.root = root
+        self.writer = writer or durable_writer
+        self.logs = {'leads': _AppendLogCollection(os.path.join(root, 'imported-leads.ndjson'), self.writer)}
+        self.changes = _ChangeLog(os.path.join(root, 'changes.ndjson'))
+        self._dirs = set()
+        self._locks = {}
+        self.local = threading.local()
+
+    def _batched(self, collection):
+        # The open batch of this thread, if documents of this collection go through it
+        batch = getattr(self.local, 'batch', None)
+        return batch if batch is not None and collection not in self.logs else None
+
+    @contextmanager
+    def batch(self):
+        # Documents written in the batch are held as serialized JSON (None
+        # for a delete) and readable by this thread; on exit each file is
+        # written once and the change log gets one record per collection.
+        if getattr(self.local, 'batch', None) is not None:
+            yield
+            return
+        self.local.batch = {}
+        try:
+            yield
+        finally:
+            batch, self.local.batch = self.local.batch, None
+            self._flush_batch(batch)
+
+    @contextmanager
+    def transaction(self):
+        # Row streams are written straight through, so inside a batch the
+        # documents written alongside them are persisted when the outermost
+        # transaction ends, keeping rows and metadata (e.g. contactCount) in step
+        depth = getattr(self.local, 'depth', 0)
+        self.local.depth = depth + 1
+        try:
+            yield
+        finally:
+            self.local.depth = depth
+            if depth == 0:
+                self.checkpoint()
+
+    def checkpoint(self):
+        batch = getattr(self.local, 'batch', None)
+        if batch:
+            self.local.batch = {}
+            self._flush_batch(batch)
+
+    def _flush_batch(self, batch):
+        upserts, deletes = {}, {}
+        for (collection, key), data in batch.items():
+            (upserts if data is not None else deletes).setdefault(collection, []).append((key, data))
+        self.writer.replace_many([(self._path(collection, key, '.json'), data)
+                                  for collection, docs in upserts.items() for key, data in docs])
+        for collection, docs in deletes.items():
+            for key, _ in docs:
+                path = self._path(collection, key, '.json')
+                if os.path.exists(path):
+                    os.remove(path)
+        for collection, docs in upserts.items():
+            self._changed(collection, [key for key, _ in docs], 'upsert')
+        for collection, docs in deletes.items():
+            self._changed(collection, [key for key, _ in docs], 'delete')
+
+    def _changed(self, collection, keys, op):
+        if collection in CHANGE_TRACKED and keys:
+            self.changes.record(collection, keys, op)
+
+    def _path(self, collection, key, ext):
+        directory = os.path.join(self.root, collection)
+        if directory not in self._dirs:
+            os.makedirs(directory, exist_ok=True)
+            self._dirs.add(directory)
+        return os.path.join(directory, f'{key}{ext}')
+
+    def get(self, collection, key):
+        if collection in self.logs:
+            return self.logs[collection].get(key)
+        batch = self._batched(collection)
+        if batch is not None and (collection, key) in batch:
+            data = batch[(collection, key)]
+            return json.loads(data) if data is not None else None
+        path = self._path(collection, key, '.json')
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def put(self, collection, key, doc):
+        self.put_many(collection, [(key, doc)])
+
+    def put_many(self, collection, docs):
+        docs = list(docs)
+        batch = self._batched(collection)
+        if batch is not None:
+            for key, doc in docs:
+                batch[(collection, key)] = json.dumps(doc, indent=2).encode()
+            return
+        if collection in self.logs:
+            self.logs[collection].put_many(docs)
+        else:
+            for key, doc in docs:
+                self.writer.replace(self._path(collection, key, '.json'), json.dumps(doc, indent=2).encode())
+        self._changed(collection, [key for key, _ in docs], 'upsert')
+
+    def delete(self, collection, key):
+        batch = self._batched(collection)
+        if batch is not None:
+            if (collection, key) in batch:
+                deleted = batch[(collection, key)] is not None
+            else:
+                deleted = os.path.exists(self._path(collection, key, '.json'))
+            if deleted:
+                batch[(collection, key)] = None
+            return deleted
+        if collection in self.logs:
+            deleted = self.logs[collection].delete(key)
+        else:
+            path = self._path(collection, key, '.json')
+            deleted = os.path.exists(path)
+            if deleted:
+                os.remove(path)
+        if deleted:
+            self._changed(collection, [key], 'delete')
+        return deleted
+
+    def _names(self, collection, ext):
+        directory = os.path.join(self.root, collection)
+        if not os.path.isdir(directory):
+            return []
+        return [f[:-len(ext)] for f in os.listdir(directory) if f.endswith(ext)]
+
+    def keys(self, collection):
+        if collection in self.logs:
+            return self.logs[collection].keys()
+        keys = self._names(collection, '.json')
+        batch = self._batched(collection)
+        if batch:
+            pending = {k: data for (c, k), data in batch.items() if c == collection}
+            keys = [k for k in keys if k not in pending] + [k for k, data in pending.items() if data is not None]
+        return keys
+
+    def list(self, collection):
+        if collection in self.logs:
+            return self.logs[collection].list()
+        return super().list(collection)
+
+    def rows_append(self, collection, key, rows):
+        lines = [json.dumps(row, separators=(',', ':')) + '\n' for row in rows]
+        if lines:
+            self.writer.append(self._path(collection, key, '.rows'), ''.join(lines).encode())
+        return len(lines)
+
+    def rows_iter(self, collection, key, start=0):
+        path = self._path(collection, key, '.rows')
+        if not os.path.exists(path):
+            return
+        with open(path) as f:
+            index = 0
+            for line in f:
+                if not line.strip():
+                    continue
+                if index >= start:
+                    yield json.loads(line)
+                index += 1
+
+    def rows_iter_reverse(self, collection, key, block_size=65536):
+        # Reads the file backwards a block at a time, so the newest rows of a
+        # long stream cost the same as those of a short one
+        path = self._path(collection, key, '.rows')
+        if not os.path.exists(path):
+            return
+        with open(path, 'rb') as f:
+            pos = f.seek(0, os.SEEK_END)
+            carry = b''
+            # Bytes after the last newline belong to an append still in progress
+            partial = True
+            while pos > 0:
+                step = min(block_size, pos)
+                pos -= step
+                f.seek(pos)
+                lines = (f.read(step) + carry).split(b'\n')
+                if partial:
+                    if len(lines) == 1:
+                        carry = b''
+                        continue
+                    lines.pop()
+                    partial = False
+                carry = lines.pop(0) if pos > 0 else b''
+                for line in reversed(lines):
+                    if line.strip():
+                        yield json.loads(line)
+
+    def rows_read_from(self, collection, key, cursor=0):
+        # The cursor is a byte offset; a trailing partial line is left for next time
+        path = self._path(collection, key, '.rows')
+        if not os.path.exists(path):
+            return [], 0
+        rows = []
+        with open(path, 'rb') as f:
+            f.seek(cursor)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                cursor += len(line)
+                if line.strip():
+                    rows.append(json.loads(line))
+        return rows, cursor
+
+    def rows_replace(self, collection, key, rows):
+        lines = [json.dumps(row, separators=(',', ':')) + '\n' for row in rows]
+        self.writer.replace(self._path(collection, key, '.rows'), ''.join(lines).encode())
+        return len(lines)
+
+    def rows_delete(self, collection, key):
+        path = self._path(collection, key, '.rows')
+        if os.path.exists(path):
+            os.remove(path)
+
+    def row_keys(self, collection):
+        return self._names(collection, '.rows')
+
+    def get_singleton(self, name, default=None):
+        path = os.path.join(self.root, f'{name}.json')
+        if not os.path.exists(path):
+            return default
+        with open(path) as f:
+            return json.load(f)
+
+    def put_singleton(self, name, data):
+        self.writer.replace(os.path.join(self.root, f'{name}.json'), json.dumps(data, indent=2).encode())
+
+    def change_seq(self):
+        return self.changes.current()
+
+    @contextmanager
+    def exclusive(self, name):
+        lock = self._locks.setdefault(name, InterProcessLock(os.path.join(self.root, '.locks', f'{name}.lock')))
+        with lock:
+            yield
+
+    def changes_since(self, collection, since):
+        return self.changes.since(collection, since)
+
+    def touch(self, collection, keys):
+        self._changed(collection, list(keys), 'upsert')
+
+
+class SqliteBackend(StorageBackend):
+    """All collections in one SQLite database (WAL mode, one connection per thread).
+
+    Documents are stored as JSON text with phone, leadId, status and the
+    timestamps copied into indexed columns, so find() on those fields is an
+    index lookup instead of a full scan.
+    """
+
+    name = 'sqlite'
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS documents (
+            collection TEXT NOT NULL,
+            key TEXT NOT NULL,
+            doc TEXT NOT NULL,
+            phone TEXT,
+            lead_id TEXT,
+            status TEXT,
+            created_at TEXT,
+            updated_at TEXT,
+            PRIMARY KEY (collection, key)
+        );
+        CREATE INDEX IF NOT EXISTS idx_documents_phone ON documents (collection, phone);
+        CREATE INDEX IF NOT EXISTS idx_documents_lead_id ON documents (collection, lead_id);
+        CREATE INDEX IF NOT EXISTS idx_documents_status ON documents (collection, status);
+        CREATE INDEX IF NOT EXISTS idx_documents_created_at ON documents (collection, created_at);
+        CREATE INDEX IF NOT EXISTS idx_documents_updated_at ON documents (collection, updated_at);
+        CREATE TABLE IF NOT EXISTS rows (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            collection TEXT NOT NULL,
+            key TEXT NOT NULL,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_rows_key ON rows (collection, key, seq);
+        CREATE TABLE IF NOT EXISTS singletons (
+            name TEXT PRIMARY KEY,
+            data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS changes (
+            collection TEXT NOT NULL,
+            key TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            op TEXT NOT NULL,
+            PRIMARY KEY (collection, key)
+        );
+        CREATE INDEX IF NOT EXISTS idx_changes_seq ON changes (seq);
+    '''
+
+    # PRAGMA synchronous for each WRITE_DURABILITY level; in WAL mode NORMAL
+    # only syncs at checkpoints, which is SQLite's own form of group commit
+    SYNCHRONOUS = {'none': 'OFF', 'batched': 'NORMAL', 'per-write': 'FULL'}
+
+    def __init__(self, path, durability=None):
+        self.path = path
+        self.synchronous = self.SYNCHRONOUS.get(durability or WRITE_DURABILITY, 'NORMAL')
+        self.local = threading.local()
+        self._conn().executescript(self.SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self.local, 'conn', None)
+        # A connection must not be used across fork, so a worker opens its own
+        if conn is None or self.local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(f'PRAGMA synchronous={self.synchronous}')
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+            self.local.depth = 0
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        conn = self._conn()
+        if self.local.depth:
+            self.local.depth += 1
+            try:
+                yield conn
+            finally:
+                self.local.depth -= 1
+            return
+        self.local.depth = 1
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        else:
+            conn.execute('COMMIT')
+        finally:
+            self.local.depth = 0
+
+    @contextmanager
+    def batch(self):
+        # No enclosing transaction: it would hold the write lock while the
+        # batch waits for a record lock whose holder is waiting to write. In
+        # WAL mode separate commits are cheap anyway.
+        yield
+
+    def get(self, collection, key):
+        row = self._conn().execute(
+            'SELECT doc FROM documents WHERE collection = ? AND key = ?', (collection, key)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, collection, key, doc):
+        self.put_many(collection, [(key, doc)])
+
+    def put_many(self, collection, docs):
+        params = []
+        for key, doc in docs:
+            indexed = [doc.get(field) for field in INDEXED_FIELDS]
+            params.append((collection, key, json.dumps(doc, separators=(',', ':')),
+                           *[str(v) if v is not None else None for v in indexed]))
+        with self.transaction() as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO documents (collection, key, doc, phone, lead_id, status, created_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)', params)
+            self._changed(conn, collection, [p[1] for p in params], 'upsert')
+
+    def delete(self, collection, key):
+        with self.transaction() as conn:
+            cur = conn.execute('DELETE FROM documents WHERE collection = ? AND key = ?', (collection, key))
+            if cur.rowcount > 0:
+                self._changed(conn, collection, [key], 'delete')
+            return cur.rowcount > 0
+
+    def _changed(self, conn, collection, keys, op):
+        # Called inside a transaction, so the sequence and the write commit together
+        if collection not in CHANGE_TRACKED or not keys:
+            return
+        seq = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM changes').fetchone()[0]
+        conn.executemany('INSERT OR REPLACE INTO changes (collection, key, seq, op) VALUES (?, ?, ?, ?)',
+                         [(collection, key, seq + i, op) for i, key in enumerate(keys, start=1)])
+
+    def change_seq(self):
+        return self._conn().execute('SELECT COALESCE(MAX(seq), 0) FROM changes').fetchone()[0]
+
+    def changes_since(self, collection, since):
+        # Plain reads, no write lock. The seq is read first, so a change
+        # committed in between is returned again next time rather than missed.
+        conn = self._conn()
+        seq = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM changes').fetchone()[0]
+        rows = conn.execute('SELECT key, op FROM changes WHERE collection = ? AND seq > ? ORDER BY seq',
+                            (collection, since)).fetchall()
+        return [k for k, op in rows if op == 'upsert'], [k for k, op in rows if op == 'delete'], seq
+
+    def touch(self, collection, keys):
+        with self.transaction() as conn:
+            self._changed(conn, collection, list(keys), 'upsert')
+
+    def keys(self, collection):
+        return [r[0] for r in self._conn().execute(
+            'SELECT key FROM documents WHERE collection = ?', (collection,))]
+
+    def list(self, collection):
+        cur = self._conn().execute('SELECT doc FROM documents WHERE collection = ?', (collection,))
+        for (doc,) in cur:
+            yield json.loads(doc)
+
+    def find(self, collection, **filters):
+        where, params, rest = ['collection = ?'], [collection], {}
+        for field, value in filters.items():
+            if field in INDEXED_FIELDS:
+                where.append(f'{INDEXED_FIELDS[field]} = ?')
+                params.append(str(value))
+            else:
+                rest[field] = value
+        cur = self._conn().execute(f"SELECT doc FROM documents WHERE {' AND '.join(where)}", params)
+        for (doc,) in cur:
+            doc = json.loads(doc)
+            if all(doc.get(k) == v for k, v in rest.items()):
+                yield doc
+
+    def rows_append(self, collection, key, rows):
+        params = [(collection, key, json.dumps(row, separators=(',', ':'))) for row in rows]
+        with self.transaction() as conn:
+            conn.executemany('INSERT INTO rows (collection, key, data) VALUES (?, ?, ?)', params)
+        return len(params)
+
+    def rows_iter(self, collection, key, start=0):
+        cur = self._conn().execute(
+            'SELECT data FROM rows WHERE collection = ? AND key = ? ORDER BY seq LIMIT -1 OFFSET ?',
+            (collection, key, start))
+        for (data,) in cur:
+            yield json.loads(data)
+
+    def rows_iter_reverse(self, collection, key):
+        cur = self._conn().execute(
+            'SELECT data FROM rows WHERE collection = ? AND key = ? ORDER BY seq DESC', (collection, key))
+        for (data,) in cur:
+            yield json.loads(data)
+
+    def rows_read_from(self, collection, key, cursor=0):
+        # The cursor is the seq of the last row read
+        rows = self._conn().execute(
+            'SELECT seq, data FROM rows WHERE collection = ? AND key = ? AND seq > ? ORDER BY seq',
+            (collection, key, cursor)).fetchall()
+        return [json.loads(data) for _, data in rows], (rows[-1][0] if rows else cursor)
+
+    def rows_replace(self, collection, key, rows):
+        rows = list(rows)
+        with self.transaction() as conn:
+            conn.execute('DELETE FROM rows WHERE collection = ? AND key = ?', (collection, key))
+            return self.rows_append(collection, key, rows)
+
+    def rows_delete(self, collection, key):
+        with self.transaction() as conn:
+            conn.execute('DELETE FROM rows WHERE collection = ? AND key = ?', (collection, key))
+
+    def row_keys(self, collection):
+        return [r[0] for r in self._conn().execute(
+            'SELECT DISTINCT key FROM rows WHERE collection = ?', (collection,))]
+
+    def get_singleton(self, name, default=None):
+        row = self._conn().execute('SELECT data FROM singletons WHERE name = ?', (name,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def put_singleton(self, name, data):
+        with self.transaction() as conn:
+            conn.execute('INSERT OR REPLACE INTO singletons (name, data) VALUES (?, ?)',
+                         (name, json.dumps(data, separators=(',', ':'))))
+
+
+def create_storage(kind=None):
+    kind = (kind or STORAGE_BACKEND).lower()
+    if kind == 'sqlite':
+        return SqliteBackend(SQLITE_PATH)
+    if kind != 'json':
+        logger.warning(f'Unknown STORAGE_BACKEND {kind!r}, using json')
+    return JsonFileBackend(DATA_DIR)
+
+def migrate_storage(source, target, batch_size=500):
+    """Copy every document, row stream and singleton from one backend to another."""
+    counts = {'documents': 0, 'rows': 0, 'singletons': 0}
+    for collection in DOC_COLLECTIONS:
+        batch = []
+        for key in source.keys(collection):
+            doc = source.get(collection, key)
+            if doc is None:
+                continue
+            batch.append((key, doc))
+            if len(batch) >= batch_size:
+                target.put_many(collection, batch)
+                counts['documents'] += len(batch)
+                batch = []
+        if batch:
+            target.put_many(collection, batch)
+            counts['documents'] += len(batch)
+    for collection in ROW_COLLECTIONS:
+        for key in source.row_keys(collection):
+            counts['rows'] += target.rows_replace(collection, key, source.rows_iter(collection, key))
+    for name in SINGLETONS:
+        data = source.get_singleton(name)
+        if data is not None:
+            target.put_singleton(name, data)
+            counts['singletons'] += 1
+    return counts
+
+
+os.makedirs(DATA_DIR, exist_ok=True)
+storage = create_storage()
+
+# Read-modify-write of a single record (appending a message, applying a list
+# delta) holds one of these striped locks, since requests run on threads.
+# With worker processes each stripe is also a lock file, so the lock covers
+# every worker (hash() agrees between them, as they fork from one interpreter).
+# Inside a storage.batch() the thread's writes are persisted before its
+# outermost record lock is released, so the next holder never reads a record
+# whose update is still waiting in the batch.
+_RECORD_LOCKS = [threading.RLock() for _ in range(64)]
+_record_locks_held = threading.local()
+
+@contextmanager
+def record_lock(collection, key):
+    with _RECORD_LOCKS[hash((collection, key)) % len(_RECORD_LOCKS)]:
+        depth = getattr(_record_locks_held, 'depth', 0)
+        _record_locks_held.depth = depth + 1
+        try:
+            yield
+        finally:
+            _record_locks_held.depth = depth
+            if depth == 0:
+                storage.checkpoint()
+
+def share_record_locks():
+    _RECORD_LOCKS[:] = [InterProcessLock(os.path.join(LOCK_DIR, f'record-{i}.lock'))
+                        for i in range(len(_RECORD_LOCKS))]
+
+
+# ─── Delta Sync ───────────────────────────────────────────────
+def changes_since(collection, since, summarize):
+    """Records changed after `since` in the collection's change sequence.
+
+    Returns (summaries of upserted records, deleted keys, current seq), or
+    None when `since` is ahead of the store (e.g. after a restore) and the
+    client has to resync from scratch.
+    """
+    upserted, deleted, seq = storage.changes_since(collection, since)
+    if since > seq:
+        return None
+    items = []
+    for key in upserted:
+        doc = storage.get(collection, key)
+        if doc is None:
+            deleted.append(key)
+        else:
+            items.append(summarize(doc))
+    return items, deleted, seq
 
 
 # ─── Flow Storage ───────────────────────────────────────────────
-def flows_get_all():
-    flows = []
-    for f in os.listdir(FLOWS_DIR):
-        if f.endswith('.json'):
-            with open(os.path.join(FLOWS_DIR, f)) as fh:
-                data = json.load(fh)
-                flows.append({
-                    'id': data.get('id'),
-                    'name': data.get('name'),
-                    'isActive': data.get('isActive', False),
-                    'updatedAt': data.get('updatedAt', '')
-                })
-    return flows
+def flows_iter_all():
+    for data in storage.list('flows'):
+        yield {
+            'id': data.get('id'),
+            'name': data.get('name'),
+            'isActive': data.get('isActive', False),
+            'updatedAt': data.get('updatedAt', '')
+        }
 
 def flows_get_by_id(flow_id):
-    path = os.path.join(FLOWS_DIR, f'{flow_id}.json')
-    if not os.path.exists(path):
-        return None
-    with open(path) as f:
-        return json.load(f)
+    return storage.get('flows', flow_id)
 
 def flows_save(flow):
     now = datetime.utcnow().isoformat() + 'Z'
@@ -89,51 +1415,98 @@ def flows_save(flow):
         flow['id'] = 'flow_' + str(int(datetime.utcnow().timestamp() * 1000)) + '_' + uuid.uuid4().hex[:4]
         flow['createdAt'] = now
     flow['updatedAt'] = now
-    path = os.path.join(FLOWS_DIR, f"{flow['id']}.json")
-    with open(path, 'w') as f:
-        json.dump(flow, f, indent=2)
+    storage.put('flows', flow['id'], flow)
     return flow
 
 def flows_delete(flow_id):
-    path = os.path.join(FLOWS_DIR, f'{flow_id}.json')
-    if os.path.exists(path):
-        os.remove(path)
-        return True
-    return False
+    return storage.delete('flows', flow_id)
 
 def flows_set_active(flow_id):
-    for f in os.listdir(FLOWS_DIR):
-        if f.endswith('.json'):
-            path = os.path.join(FLOWS_DIR, f)
-            with open(path) as fh:
-                data = json.load(fh)
-            data['isActive'] = (data.get('id') == flow_id)
-            data['updatedAt'] = datetime.utcnow().isoformat() + 'Z'
-            with open(path, 'w') as fh:
-                json.dump(data, fh, indent=2)
+    now = datetime.utcnow().isoformat() + 'Z'
+    updated = []
+    for data in storage.list('flows'):
+        data['isActive'] = (data.get('id') == flow_id)
+        data['updatedAt'] = now
+        updated.append((data['id'], data))
+    storage.put_many('flows', updated)
 
 def flows_get_active():
-    for f in os.listdir(FLOWS_DIR):
-        if f.endswith('.json'):
-            with open(os.path.join(FLOWS_DIR, f)) as fh:
-                data = json.load(fh)
-                if data.get('isActive'):
-                    return data
+    for data in storage.list('flows'):
+        if data.get('isActive'):
+            return data
     return None
 
 
 # ─── Conversation Storage ───────────────────────────────────────
+# Each conversation is a metadata document (lead, flow state, messageCount,
+# lastMessage, timestamps) in 'conversations' plus a row stream of its
+# messages in 'messages', oldest first. A status change is appended as an
+# update row {'_update': <message id>, 'status': ...} rather than rewriting
+# the history; the stream is compacted once updates outnumber messages.
+# Pages of history are read from the tail, so opening a long-lived chat
+# costs the same as opening a new one. Each message carries its ordinal
+# 'seq', which page cursors use to seek into the stream, and updates only
+# look for their message among the newest CONV_UPDATE_WINDOW, so an update
+# row is never further than that many messages past its message.
+CONV_MESSAGES_PAGE_SIZE = 50
+CONV_MESSAGES_MAX_PAGE_SIZE = 500
+CONV_UPDATE_WINDOW = 1000
+
 def sanitize_phone(phone):
     return ''.join(c for c in phone if c.isdigit() or c == '+')
 
+def _conv_read_meta(data):
+    if 'messages' not in data:
+        return data
+    # Legacy single-document conversation: split it into header + rows on
+    # first read, re-read under the lock so a concurrent split or message
+    # write is not overwritten
+    with record_lock('conversations', data['phone']):
+        current = storage.get('conversations', data['phone'])
+        if current is None:
+            data.pop('messages')
+            return data
+        if 'messages' in current:
+            messages = current.pop('messages') or []
+            for seq, message in enumerate(messages):
+                message['seq'] = seq
+            with storage.transaction():
+                current['messageCount'] = storage.rows_replace('messages', current['phone'], messages)
+                current['lastMessage'] = messages[-1] if messages else None
+                current['updateCount'] = 0
+                storage.put('conversations', current['phone'], current)
+    return current
+
 def convs_get_by_phone(phone):
-    path = os.path.join(CONVS_DIR, f'{sanitize_phone(phone)}.json')
-    if not os.path.exists(path):
-        return None
-    with open(path) as f:
-        return json.load(f)
+    """Conversation metadata (no message history; see convs_get_messages).
+
+    An archived conversation is restored to the hot store first.
+    """
+    phone = sanitize_phone(phone)
+    data = storage.get('conversations', phone)
+    if data is None:
+        if conversation_archive.get(phone) is None:
+            return None
+        with record_lock('conversations', phone):
+            data = storage.get('conversations', phone) or conversation_archive.restore(phone)
+        if data is None:
+            return None
+    return _conv_read_meta(data)
+
+def convs_get_by_lead(lead_id):
+    """Most recently updated conversation linked to a lead, restoring an archived one."""
+    conv = max(storage.find('conversations', leadId=lead_id),
+               key=lambda c: c.get('updatedAt', ''), default=None)
+    if conv is None:
+        entry = conversation_archive.find_lead(lead_id)
+        return convs_get_by_phone(entry[0]) if entry else None
+    return _conv_read_meta(conv)
 
 def convs_create_or_get(phone, lead_id=None, lead_name=''):
+    with record_lock('conversations', sanitize_phone(phone)):
+        return _convs_create_or_get(phone, lead_id, lead_name)
+
+def _convs_create_or_get(phone, lead_id, lead_name):
     conv = convs_get_by_phone(phone)
     if not conv:
         now = datetime.utcnow().isoformat() + 'Z'
@@ -142,74 +1515,575 @@ def convs_create_or_get(phone, lead_id=None, lead_name=''):
             'leadId': lead_id,
             'leadName': lead_name,
             'flowState': None,
-            'messages': [],
+            'messageCount': 0,
+            'lastMessage': None,
+            'updateCount': 0,
             'createdAt': now,
             'updatedAt': now
         }
         convs_save(conv)
+        contact_index.add({'phone': conv['phone']}, 'conv:' + conv['phone'])
+        contact_index.save()
+        message_index.add_conversation(conv)
+        message_index.save()
     return conv
 
 def convs_add_message(phone, message):
-    conv = convs_create_or_get(phone)
-    if not message.get('id'):
-        message['id'] = 'msg_' + str(int(datetime.utcnow().timestamp() * 1000)) + '_' + uuid.uuid4().hex[:4]
-    if not message.get('timestamp'):
-        message['timestamp'] = datetime.utcnow().isoformat() + 'Z'
-    conv['messages'].append(message)
-    conv['updatedAt'] = datetime.utcnow().isoformat() + 'Z'
-    convs_save(conv)
+    with record_lock('conversations', sanitize_phone(phone)):
+        conv = _convs_create_or_get(phone, None, '')
+        if not message.get('id'):
+            message['id'] = 'msg_' + str(int(datetime.utcnow().timestamp() * 1000)) + '_' + uuid.uuid4().hex[:4]
+        if not message.get('timestamp'):
+            message['timestamp'] = datetime.utcnow().isoformat() + 'Z'
+        message['seq'] = conv.get('messageCount', 0)
+        with storage.transaction():
+            storage.rows_append('messages', conv['phone'], [message])
+            conv['messageCount'] = conv.get('messageCount', 0) + 1
+            conv['lastMessage'] = message
+            conv['updatedAt'] = datetime.utcnow().isoformat() + 'Z'
+            convs_save(conv)
+        message_index.add_message(conv['phone'], message)
+        message_index.save()
+    conv_events.publish('message', conv['phone'], {'message': message})
     return message
 
+def convs_update_status(phone, wa_message_id, status):
+    """Apply a WhatsApp delivery status to the matching outgoing message."""
+    # Statuses arrive for recent messages; older ones are not searched for
+    return _convs_update_message(phone, lambda m: m.get('waMessageId') == wa_message_id, {'status': status})
+
+def convs_update_message(phone, message_id, fields):
+    """Set fields (e.g. status, waMessageId) on one message by its id."""
+    return _convs_update_message(phone, lambda m: m.get('id') == message_id, fields)
+
+def _convs_update_message(phone, match, fields):
+    with record_lock('conversations', sanitize_phone(phone)):
+        conv = convs_get_by_phone(phone)
+        if not conv:
+            return None
+        recent = itertools.islice(_iter_messages_newest_first(conv['phone']), CONV_UPDATE_WINDOW)
+        updated = next((m for m in recent if match(m)), None)
+        if updated is None:
+            return None
+        updated.update(fields)
+        with storage.transaction():
+            storage.rows_append('messages', conv['phone'], [{'_update': updated['id'], **fields}])
+            conv['updateCount'] = conv.get('updateCount', 0) + 1
+            if (conv.get('lastMessage') or {}).get('id') == updated['id']:
+                conv['lastMessage'] = updated
+            if conv['updateCount'] > max(conv.get('messageCount', 0), CONV_MESSAGES_PAGE_SIZE):
+                _convs_compact_messages(conv)
+            convs_save(conv)
+    conv_events.publish('status', conv['phone'], {
+        'messageId': updated.get('id'), 'waMessageId': updated.get('waMessageId'), 'status': updated.get('status')
+    })
+    return updated
+
+def _convs_compact_messages(conv):
+    """Rewrite the message stream with every update row folded in."""
+    messages = list(_iter_messages_newest_first(conv['phone']))
+    messages.reverse()
+    for seq, message in enumerate(messages):
+        message['seq'] = seq
+    conv['messageCount'] = storage.rows_replace('messages', conv['phone'], messages)
+    conv['updateCount'] = 0
+
+def _iter_messages_newest_first(phone):
+    pending = {}
+    for row in storage.rows_iter_reverse('messages', phone):
+        if '_update' in row:
+            # Newer updates are seen first and win
+            fields = pending.setdefault(row['_update'], {})
+            for k, v in row.items():
+                if k != '_update':
+                    fields.setdefault(k, v)
+            continue
+        fields = pending.pop(row.get('id'), None)
+        if fields:
+            row.update(fields)
+        yield row
+
+def _convs_messages_from(phone, seq, count):
+    """Up to `count` messages from ordinal `seq` on, read forwards from that
+    position; None if they predate 'seq' on messages."""
+    page, ids, updates, past = [], set(), {}, 0
+    # A message is never before its ordinal in the stream (update rows only add)
+    for row in storage.rows_iter('messages', phone, seq):
+        if '_update' in row:
+            if row['_update'] in ids:
+                updates.setdefault(row['_update'], {}).update(row)
+            continue
+        if 'seq' not in row:
+            return None
+        if row['seq'] < seq:
+            continue
+        if len(page) < count:
+            page.append(row)
+            ids.add(row['id'])
+        else:
+            # Updates to the page are within CONV_UPDATE_WINDOW messages of it
+            past += 1
+            if past > CONV_UPDATE_WINDOW:
+                break
+    for m in page:
+        fields = updates.get(m['id'])
+        if fields:
+            fields.pop('_update')
+            m.update(fields)
+    return page
+
+def convs_get_messages(phone, before=None, after=None, limit=CONV_MESSAGES_PAGE_SIZE):
+    """Return (messages oldest first, has_more) for one page of history.
+
+    Without a cursor this is the newest page. `before` pages towards older
+    messages and `after` towards newer ones; has_more says whether another
+    page exists in that direction. A cursor is a message id or, as in page
+    cursors, a message's seq, which seeks rather than scanning back from the
+    newest. Returns None for an unknown cursor.
+    """
+    phone = sanitize_phone(phone)
+    cursor = after or before
+    is_cursor = lambda m: m.get('id') == cursor
+    if cursor and cursor.isdigit():
+        seq = int(cursor)
+        if after:
+            page = _convs_messages_from(phone, seq + 1, limit + 1)
+            if page is not None:
+                return page[:limit], len(page) > limit
+        else:
+            start = max(0, seq - limit)
+            page = _convs_messages_from(phone, start, seq - start)
+            if page is not None:
+                return page, start > 0
+        is_cursor = lambda m: m.get('seq') == seq
+    messages = _iter_messages_newest_first(phone)
+    if after:
+        newer = collections.deque(maxlen=limit + 1)
+        for m in messages:
+            if is_cursor(m):
+                break
+            newer.append(m)
+        else:
+            return None
+        newer.reverse()
+        newer = list(newer)
+        return newer[:limit], len(newer) > limit
+    if before:
+        if not any(is_cursor(m) for m in messages):
+            return None
+    page = list(itertools.islice(messages, limit + 1))
+    has_more = len(page) > limit
+    page = page[:limit]
+    page.reverse()
+    return page, has_more
+
+def _conv_cursor(message):
+    return str(message['seq']) if 'seq' in message else message['id']
+
 def convs_save(conv):
-    path = os.path.join(CONVS_DIR, f"{sanitize_phone(conv['phone'])}.json")
-    with open(path, 'w') as f:
-        json.dump(conv, f, indent=2)
+    storage.put('conversations', sanitize_phone(conv['phone']), conv)
+
+def _conv_summary(data):
+    data = _conv_read_meta(data)
+    last_msg = data.get('lastMessage')
+    return {
+        'phone': data.get('phone'),
+        'leadId': data.get('leadId'),
+        'leadName': data.get('leadName', ''),
+        'lastMessage': last_msg.get('text', '[media]') if last_msg else '',
+        'lastMessageAt': last_msg.get('timestamp', data.get('createdAt')) if last_msg else data.get('createdAt'),
+        'messageCount': data.get('messageCount', 0)
+    }
 
 def convs_list_all():
-    convs = []
-    for f in os.listdir(CONVS_DIR):
-        if f.endswith('.json'):
-            with open(os.path.join(CONVS_DIR, f)) as fh:
-                data = json.load(fh)
-                last_msg = data['messages'][-1] if data.get('messages') else None
-                convs.append({
-                    'phone': data.get('phone'),
-                    'leadId': data.get('leadId'),
-                    'leadName': data.get('leadName', ''),
-                    'lastMessage': last_msg.get('text', '[media]') if last_msg else '',
-                    'lastMessageAt': last_msg.get('timestamp', data.get('createdAt')) if last_msg else data.get('createdAt'),
-                    'messageCount': len(data.get('messages', []))
-                })
+    convs = [_conv_summary(data) for data in storage.list('conversations')]
     convs.sort(key=lambda c: c.get('lastMessageAt', ''), reverse=True)
     return convs
 
 
+# ─── Conversation Archive ─────────────────────────────────────
+# Conversations idle for ARCHIVE_IDLE_DAYS move out of 'conversations' and
+# 'messages' into segment files under data/archive/. Each becomes one
+# zlib-compressed record — its metadata plus the compacted message history —
+# appended to the newest segment, so archiving never rewrites old segments.
+# An archived conversation is gone from the listing (a delete for delta
+# sync) until it is looked up by phone or lead or a message arrives for it,
+# which restores it. Search hits and contact-index references keep naming
+# its phone, so following one restores it as well.
+ARCHIVE_DIR = os.path.join(DATA_DIR, 'archive')
+ARCHIVE_SEGMENT_EXT = '.z'
+ARCHIVE_BATCH_SIZE = 200
+# Metadata fields that change whenever a conversation is written to
+ARCHIVE_CHANGE_FIELDS = ('updatedAt', 'messageCount', 'updateCount')
+
+
+class ConversationArchive:
+    """Index of archived conversations, and the job that archives them.
+
+    The index is the 'indexes/archive' row stream of
+    [phone, segment, offset, length, rawBytes, updatedAt, leadId, archivedAt];
+    a [phone, None] row marks a restored conversation and the last row for a
+    phone wins. Rows written by other worker processes are read on next use.
+    Only one archive run at a time, in any process, writes segments.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.entries = None
+        self.cursor = 0
+        self.version = None
+        self.thread = None
+
+    def _load(self):
+        # Called with self.lock held
+        version = shared.get('conv-archive')
+        if self.entries is None:
+            self.entries = {}
+        elif version == self.version:
+            return
+        self.version = version
+        rows, self.cursor = storage.rows_read_from('indexes', 'archive', self.cursor)
+        for row in rows:
+            if row[1] is None:
+                self.entries.pop(row[0], None)
+            else:
+                self.entries[row[0]] = row
+
+    def _append(self, rows):
+        storage.rows_append('indexes', 'archive', rows)
+        shared.bump('conv-archive')
+
+    def get(self, phone):
+        with self.lock:
+            self._load()
+            return self.entries.get(phone)
+
+    def find_lead(self, lead_id):
+        """The most recently updated archived conversation of a lead."""
+        with self.lock:
+            self._load()
+            return max((e for e in self.entries.values() if e[6] == lead_id),
+                       key=lambda e: e[5] or '', default=None)
+
+    def phones(self):
+        with self.lock:
+            self._load()
+            return list(self.entries)
+
+    def records(self):
+        """Yield (conversation, messages) for every archived conversation."""
+        with self.lock:
+            self._load()
+            entries = list(self.entries.values())
+        for entry in entries:
+            try:
+                record = self._read(entry)
+            except FileNotFoundError:
+                # Restored and its segment dropped meanwhile
+                continue
+            yield record['conversation'], record['messages']
+
+    def _segments(self):
+        """Segment file name -> size, oldest first."""
+        if not os.path.isdir(self.directory):
+            return {}
+        sizes = {}
+        for name in sorted(os.listdir(self.directory)):
+            if name.endswith(ARCHIVE_SEGMENT_EXT):
+                try:
+                    sizes[name] = os.path.getsize(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+        return sizes
+
+    def _read(self, entry):
+        _, segment, offset, length = entry[:4]
+        with open(os.path.join(self.directory, segment), 'rb') as f:
+            f.seek(offset)
+            return json.loads(zlib.decompress(f.read(length)))
+
+    def restore(self, phone):
+        """Move an archived conversation back to the hot store and return its
+        metadata, or None. Call with the conversation's record_lock held."""
+        entry = self.get(phone)
+        if entry is None:
+            return None
+        record = self._read(entry)
+        conv, messages = record['conversation'], record['messages']
+        with storage.transaction():
+            storage.rows_replace('messages', phone, messages)
+            storage.put('conversations', phone, conv)
+        self._append([[phone, None]])
+        # The search index may have been rebuilt while the conversation was away
+        message_index.add_conversation(conv)
+        for message in messages:
+            message_index.add_message(phone, message)
+        message_index.save()
+        logger.info(f'Restored archived conversation {phone} ({len(messages)} messages)')
+        return conv
+
+    def run(self, idle_days=ARCHIVE_IDLE_DAYS):
+        """Archive every conversation not updated for idle_days. Returns a
+        report, or None while a run is in progress in some worker process."""
+        fd = try_process_lock('conversation-archive')
+        if fd is None:
+            return None
+        try:
+            return self._run(idle_days)
+        finally:
+            release_process_lock(fd)
+
+    def _run(self, idle_days):
+        started = time.monotonic()
+        cutoff = (datetime.utcnow() - timedelta(days=idle_days)).isoformat() + 'Z'
+        report = {'idleDays': idle_days, 'scanned': 0, 'archived': 0, 'rawBytes': 0, 'compressedBytes': 0}
+        batch = []
+        for phone in storage.keys('conversations'):
+            data = storage.get('conversations', phone)
+            if data is None:
+                continue
+            report['scanned'] += 1
+            if data.get('updatedAt', '') >= cutoff:
+                continue
+            batch.append(_conv_read_meta(data))
+            if len(batch) >= ARCHIVE_BATCH_SIZE:
+                self._archive_batch(batch, report)
+                batch = []
+        if batch:
+            self._archive_batch(batch, report)
+        self._drop_empty_segments()
+        report['seconds'] = round(time.monotonic() - started, 3)
+        report['finishedAt'] = datetime.utcnow().isoformat() + 'Z'
+        storage.put_singleton('conversation-archive', report)
+        logger.info(f"Archived {report['archived']} of {report['scanned']} conversations idle "
+                    f"{idle_days:g}+ days ({report['rawBytes']} -> {report['compressedBytes']} bytes)")
+        return report
+
+    def _archive_batch(self, convs, report):
+        now = datetime.utcnow().isoformat() + 'Z'
+        records = []
+        for conv in convs:
+            messages = list(_iter_messages_newest_first(conv['phone']))
+            messages.reverse()
+            raw = json.dumps({'conversation': dict(conv, messageCount=len(messages), updateCount=0),
+                              'messages': messages}, separators=(',', ':')).encode()
+            records.append((conv, len(raw), zlib.compress(raw)))
+        segment, offset = self._segment_for_append()
+        rows = []
+        for conv, raw_size, blob in records:
+            rows.append([conv['phone'], segment, offset, len(blob), raw_size,
+                         conv.get('updatedAt'), conv.get('leadId'), now])
+            offset += len(blob)
+        durable_writer.append(os.path.join(self.directory, segment), b''.join(blob for _, _, blob in records))
+        self._append(rows)
+        # The archived copies are durable; drop the hot ones, except where a
+        # message or status arrived since they were read
+        changed = []
+        for conv, raw_size, blob in records:
+            phone = conv['phone']
+            with record_lock('conversations', phone):
+                current = storage.get('conversations', phone)
+                if current is not None and any(current.get(f) != conv.get(f) for f in ARCHIVE_CHANGE_FIELDS):
+                    changed.append([phone, None])
+                    continue
+                with storage.transaction():
+                    storage.delete('conversations', phone)
+                    storage.rows_delete('messages', phone)
+            report['archived'] += 1
+            report['rawBytes'] += raw_size
+            report['compressedBytes'] += len(blob)
+        if changed:
+            self._append(changed)
+
+    def _segment_for_append(self):
+        """(segment name, offset) for the next append: the newest segment
+        until it reaches ARCHIVE_SEGMENT_MAX_BYTES, then a new one."""
+        os.makedirs(self.directory, exist_ok=True)
+        segments = self._segments()
+        number = 1
+        if segments:
+            name, size = list(segments.items())[-1]
+            if size < ARCHIVE_SEGMENT_MAX_BYTES:
+                return name, size
+            number = int(name[len('segment-'):-len(ARCHIVE_SEGMENT_EXT)]) + 1
+        return f'segment-{number:06d}{ARCHIVE_SEGMENT_EXT}', 0
+
+    def _drop_empty_segments(self):
+        # Once every conversation in a segment has been restored, the segment
+        # is only dead bytes. Runs under the run lock, so no append is in
+        # progress and that includes the newest segment
+        with self.lock:
+            self._load()
+            live = {entry[1] for entry in self.entries.values()}
+        for name in self._segments():
+            if name not in live:
+                os.remove(os.path.join(self.directory, name))
+                logger.info(f'Removed archive segment {name}: every conversation in it was restored')
+
+    def stats(self):
+        with self.lock:
+            self._load()
+            entries = list(self.entries.values())
+        segments = self._segments()
+        raw = sum(e[4] for e in entries)
+        compressed = sum(e[3] for e in entries)
+        return {
+            'hot': len(storage.keys('conversations')),
+            'cold': len(entries),
+            'segments': len(segments),
+            'rawBytes': raw,
+            'compressedBytes': compressed,
+            'segmentBytes': sum(segments.values()),
+            # Over archived conversations only; restored ones leave dead bytes in
+            # segments until the next run drops them
+            'savedBytes': raw - compressed,
+            'compressionRatio': round(raw / compressed, 2) if compressed else None,
+            'idleDays': ARCHIVE_IDLE_DAYS,
+            'lastRun': storage.get_singleton('conversation-archive')
+        }
+
+    def start(self):
+        if self.thread is None and ARCHIVE_INTERVAL_HOURS > 0 and ARCHIVE_IDLE_DAYS > 0:
+            self.thread = threading.Thread(target=self._schedule, name='conversation-archive', daemon=True)
+            self.thread.start()
+
+    def _schedule(self):
+        # Every worker process schedules runs; the last report's finishedAt
+        # keeps it to one per interval, across restarts too
+        interval = ARCHIVE_INTERVAL_HOURS * 3600
+        while True:
+            last = (storage.get_singleton('conversation-archive') or {}).get('finishedAt')
+            if last:
+                elapsed = (datetime.utcnow() - datetime.fromisoformat(last.rstrip('Z'))).total_seconds()
+                if elapsed < interval:
+                    time.sleep(interval - elapsed)
+                    continue
+            try:
+                if self.run() is None:
+                    # Running in another worker process
+                    time.sleep(interval)
+            except Exception as e:
+                logger.error(f'Conversation archive run failed: {e}')
+                time.sleep(interval)
+
+
+conversation_archive = ConversationArchive(ARCHIVE_DIR)
+
+
+# ─── Conversation Events (SSE) ─────────────────────────────────
+class EventBroadcaster:
+    """Fan-out of conversation events to SSE subscribers.
+
+    Events get ids of the form '<boot>-<n>', n counting events across all
+    worker processes; each worker forwards the events it publishes to the
+    others over the worker bus. Subscribers wait on a local sequence number
+    (arrival order in this process). The last SSE_REPLAY_BUFFER events are
+    kept so a reconnecting client, possibly on another worker, can resume
+    from Last-Event-ID. An id from another boot, or one older than the
+    buffer, gets a 'reset' event telling the client to refetch.
+    """
+
+    def __init__(self, buffer_size):
+        self.boot = uuid.uuid4().hex[:8]
+        self.seq = 0
+        self.last = 0
+        self.events = collections.deque(maxlen=buffer_size)
+        self.cond = threading.Condition()
+
+    def publish(self, event_type, phone, data):
+        number = shared.bump('conv-events')
+        event = {
+            'id': f'{self.boot}-{number}',
+            'number': number,
+            'event': event_type,
+            'phone': phone,
+            'data': dict(data, phone=phone)
+        }
+        self.receive(event)
+        bus.publish('conv-event', event)
+
+    def receive(self, event):
+        with self.cond:
+            self.seq += 1
+            self.events.append(dict(event, seq=self.seq))
+            self.last = max(self.last, event['number'])
+            self.cond.notify_all()
+
+    def last_id(self):
+        return f'{self.boot}-{self.last}'
+
+    def resolve(self, last_event_id):
+        """Map a Last-Event-ID to a sequence number; None means the client must reset."""
+        if not last_event_id:
+            return self.seq
+        boot, _, number = last_event_id.partition('-')
+        if boot != self.boot or not number.isdigit():
+            return None
+        number = int(number)
+        newest = shared.get('conv-events')
+        with self.cond:
+            oldest = min((e['number'] for e in self.events), default=newest + 1)
+            if number < oldest - 1 or number > newest:
+                return None
+            # Replay from the first buffered event after it; events from other
+            # workers can arrive slightly out of order, so some may repeat
+            for e in self.events:
+                if e['number'] > number:
+                    return e['seq'] - 1
+            return self.seq
+
+    def wait(self, after_seq, phone=None, timeout=None):
+        """Return (events newer than after_seq, latest seq), waiting up to timeout.
+
+        With a phone, only that conversation's events count; waits are not
+        cut short by traffic on other conversations.
+        """
+        deadline = time.monotonic() + (timeout or 0)
+        with self.cond:
+            while True:
+                events = []
+                for e in reversed(self.events):
+                    if e['seq'] <= after_seq:
+                        break
+                    if not phone or e['phone'] == phone:
+                        events.append(e)
+                after_seq = self.seq
+                remaining = deadline - time.monotonic()
+                if events or remaining <= 0:
+                    events.reverse()
+                    return events, after_seq
+                self.cond.wait(remaining)
+
+
+conv_events = EventBroadcaster(SSE_REPLAY_BUFFER)
+bus.subscribe('conv-event', conv_events.receive)
+
+
 # ─── Campaign Storage ──────────────────────────────────────────
+def _campaign_summary(data):
+    return {
+        'id': data.get('id'),
+        'name': data.get('name'),
+        'status': data.get('status', 'draft'),
+        'subject': data.get('subject', ''),
+        'stats': campaign_stats_with_tracking(data.get('id'), data.get('stats')),
+        'sentAt': data.get('sentAt'),
+        'createdAt': data.get('createdAt', ''),
+        'updatedAt': data.get('updatedAt', '')
+    }
+
 def campaigns_get_all():
-    campaigns = []
-    for f in os.listdir(CAMPAIGNS_DIR):
-        if f.endswith('.json'):
-            with open(os.path.join(CAMPAIGNS_DIR, f)) as fh:
-                data = json.load(fh)
-                campaigns.append({
-                    'id': data.get('id'),
-                    'name': data.get('name'),
-                    'status': data.get('status', 'draft'),
-                    'subject': data.get('subject', ''),
-                    'stats': data.get('stats', {'sent': 0, 'opened': 0, 'clicked': 0, 'bounced': 0}),
-                    'sentAt': data.get('sentAt'),
-                    'createdAt': data.get('createdAt', ''),
-                    'updatedAt': data.get('updatedAt', '')
-                })
+    campaigns = [_campaign_summary(data) for data in storage.list('campaigns')]
     campaigns.sort(key=lambda c: c.get('updatedAt', ''), reverse=True)
     return campaigns
 
 def campaigns_get_by_id(campaign_id):
-    path = os.path.join(CAMPAIGNS_DIR, f'{campaign_id}.json')
-    if not os.path.exists(path):
+    campaign = storage.get('campaigns', campaign_id)
+    if campaign is None:
         return None
-    with open(path) as f:
-        return json.load(f)
+    campaign['stats'] = campaign_stats_with_tracking(campaign_id, campaign.get('stats'))
+    return campaign
 
 def campaigns_save(campaign):
     now = datetime.utcnow().isoformat() + 'Z'
@@ -221,17 +2095,11 @@ def campaigns_save(campaign):
     if not campaign.get('status'):
         campaign['status'] = 'draft'
     campaign['updatedAt'] = now
-    path = os.path.join(CAMPAIGNS_DIR, f"{campaign['id']}.json")
-    with open(path, 'w') as f:
-        json.dump(campaign, f, indent=2)
+    storage.put('campaigns', campaign['id'], campaign)
     return campaign
 
 def campaigns_delete(campaign_id):
-    path = os.path.join(CAMPAIGNS_DIR, f'{campaign_id}.json')
-    if os.path.exists(path):
-        os.remove(path)
-        return True
-    return False
+    return storage.delete('campaigns', campaign_id)
 
 
 # ─── Email Template Storage ───────────────────────────────────
@@ -250,17 +2118,14 @@ DEFAULT_WELCOME_TEMPLATE = {
 
 def templates_get_all():
     templates = []
-    for f in os.listdir(TEMPLATES_DIR):
-        if f.endswith('.json'):
-            with open(os.path.join(TEMPLATES_DIR, f)) as fh:
-                data = json.load(fh)
-                templates.append({
-                    'id': data.get('id'),
-                    'name': data.get('name'),
-                    'subject': data.get('subject', ''),
-                    'isPrebuilt': data.get('isPrebuilt', False),
-                    'updatedAt': data.get('updatedAt', '')
-                })
+    for data in storage.list('templates'):
+        templates.append({
+            'id': data.get('id'),
+            'name': data.get('name'),
+            'subject': data.get('subject', ''),
+            'isPrebuilt': data.get('isPrebuilt', False),
+            'updatedAt': data.get('updatedAt', '')
+        })
     # If no templates exist, create the default welcome template
     if not templates:
         tpl = templates_save(dict(DEFAULT_WELCOME_TEMPLATE))
@@ -275,11 +2140,7 @@ def templates_get_all():
     return templates
 
 def templates_get_by_id(template_id):
-    path = os.path.join(TEMPLATES_DIR, f'{template_id}.json')
-    if not os.path.exists(path):
-        return None
-    with open(path) as f:
-        return json.load(f)
+    return storage.get('templates', template_id)
 
 def templates_save(template):
     now = datetime.utcnow().isoformat() + 'Z'
@@ -287,77 +2148,928 @@ def templates_save(template):
         template['id'] = 'tpl_' + str(int(datetime.utcnow().timestamp() * 1000)) + '_' + uuid.uuid4().hex[:4]
         template['createdAt'] = now
     template['updatedAt'] = now
-    path = os.path.join(TEMPLATES_DIR, f"{template['id']}.json")
-    with open(path, 'w') as f:
-        json.dump(template, f, indent=2)
+    storage.put('templates', template['id'], template)
     return template
 
 def templates_delete(template_id):
-    path = os.path.join(TEMPLATES_DIR, f'{template_id}.json')
-    if os.path.exists(path):
-        os.remove(path)
-        return True
-    return False
+    return storage.delete('templates', template_id)
 
 
 # ─── Contact List Storage ─────────────────────────────────────
+# Each list is a metadata document (name, description, contactCount,
+# timestamps) in 'contact-lists' plus a row stream of its members, one
+# compact array per contact: [name, email, phone, company, {extra}]. Listing
+# and counting never touch the members, and pages of members are read
+# incrementally.
+CONTACT_ROW_FIELDS = ('name', 'email', 'phone', 'company')
+CONTACTLIST_PAGE_SIZE = 100
+CONTACTLIST_MAX_PAGE_SIZE = 1000
+
+def contact_to_row(contact):
+    # A column the contact does not have is null, so reading it back leaves
+    # the key out instead of adding an empty one
+    row = [contact.get(k) for k in CONTACT_ROW_FIELDS]
+    extra = {k: v for k, v in contact.items() if k not in CONTACT_ROW_FIELDS}
+    if extra:
+        row.append(extra)
+    return row
+
+def row_to_contact(row):
+    contact = {k: v for k, v in zip(CONTACT_ROW_FIELDS, row) if v is not None}
+    if len(row) > len(CONTACT_ROW_FIELDS):
+        contact.update(row[len(CONTACT_ROW_FIELDS)])
+    return contact
+
+def contact_identity_keys(contact):
+    """Keys a contact can be matched by: lowercased email and WhatsApp-form phone."""
+    if isinstance(contact, str):
+        contact = {'email': contact} if '@' in contact else {'phone': contact}
+    keys = set()
+    email = (contact.get('email') or '').strip().lower()
+    if email:
+        keys.add('e:' + email)
+    phone = sanitize_wa_phone(contact.get('phone') or '')
+    if phone:
+        keys.add('p:' + phone)
+    return keys
+
+def _contactlist_read_meta(data):
+    if 'contacts' not in data:
+        return data
+    # Legacy single-document list: split it into header + rows on first read,
+    # under the lock like _conv_read_meta
+    with record_lock('contact-lists', data['id']):
+        current = storage.get('contact-lists', data['id'])
+        if current is None:
+            data.pop('contacts')
+            return data
+        if 'contacts' in current:
+            contacts = current.pop('contacts') or []
+            with storage.transaction():
+                current['contactCount'] = storage.rows_replace(
+                    'contact-lists', current['id'], (contact_to_row(c) for c in contacts))
+                storage.put('contact-lists', current['id'], current)
+    return current
+
+def _contactlist_summary(data):
+    data = _contactlist_read_meta(data)
+    return {
+        'id': data.get('id'),
+        'name': data.get('name'),
+        'description': data.get('description', ''),
+        'contactCount': data.get('contactCount', 0),
+        'updatedAt': data.get('updatedAt', '')
+    }
+
 def contactlists_get_all():
-    lists = []
-    for f in os.listdir(CONTACTLISTS_DIR):
-        if f.endswith('.json'):
-            with open(os.path.join(CONTACTLISTS_DIR, f)) as fh:
-                data = json.load(fh)
-                lists.append({
-                    'id': data.get('id'),
-                    'name': data.get('name'),
-                    'description': data.get('description', ''),
-                    'contactCount': len(data.get('contacts', [])),
-                    'updatedAt': data.get('updatedAt', '')
-                })
+    lists = [_contactlist_summary(data) for data in storage.list('contact-lists')]
     lists.sort(key=lambda l: l.get('updatedAt', ''), reverse=True)
     return lists
 
+def contactlists_get_meta(list_id):
+    data = storage.get('contact-lists', list_id)
+    if data is None:
+        return None
+    return _contactlist_read_meta(data)
+
+def contactlists_iter_contacts(list_id, start=0):
+    for row in storage.rows_iter('contact-lists', list_id, start):
+        yield row_to_contact(row)
+
 def contactlists_get_by_id(list_id):
-    path = os.path.join(CONTACTLISTS_DIR, f'{list_id}.json')
-    if not os.path.exists(path):
+    """Full list including every contact; prefer contactlists_get_page for APIs."""
+    meta = contactlists_get_meta(list_id)
+    if meta is None:
         return None
-    with open(path) as f:
-        return json.load(f)
+    meta['contacts'] = list(contactlists_iter_contacts(list_id))
+    return meta
+
+def contactlists_get_page(list_id, offset=0, limit=CONTACTLIST_PAGE_SIZE, query=''):
+    """Return (contacts, total) for one page, optionally filtered by a search string."""
+    query = query.strip().lower()
+    if not query:
+        meta = contactlists_get_meta(list_id) or {}
+        contacts = list(itertools.islice(contactlists_iter_contacts(list_id, offset), limit))
+        return contacts, meta.get('contactCount', 0)
+    contacts = []
+    total = 0
+    for contact in contactlists_iter_contacts(list_id):
+        if not any(query in str(v).lower() for v in contact.values()):
+            continue
+        if offset <= total < offset + limit:
+            contacts.append(contact)
+        total += 1
+    return contacts, total
 
 def contactlists_save(contact_list):
+    """Save list metadata; a 'contacts' key replaces the list's contacts."""
     now = datetime.utcnow().isoformat() + 'Z'
     if not contact_list.get('id'):
         contact_list['id'] = 'cl_' + str(int(datetime.utcnow().timestamp() * 1000)) + '_' + uuid.uuid4().hex[:4]
         contact_list['createdAt'] = now
     contact_list['updatedAt'] = now
-    path = os.path.join(CONTACTLISTS_DIR, f"{contact_list['id']}.json")
-    with open(path, 'w') as f:
-        json.dump(contact_list, f, indent=2)
+    meta = {k: v for k, v in contact_list.items() if k != 'contacts'}
+    contacts = contact_list.get('contacts') or []
+    with storage.transaction():
+        if 'contacts' in contact_list:
+            meta['contactCount'] = storage.rows_replace('contact-lists', meta['id'], (contact_to_row(c) for c in contacts))
+        meta.setdefault('contactCount', 0)
+        storage.put('contact-lists', meta['id'], meta)
+    if contacts:
+        for contact in contacts:
+            contact_index.add(contact, 'list:' + meta['id'])
+        contact_index.save()
+    contact_list['contactCount'] = meta['contactCount']
     return contact_list
 
+def contactlists_apply_delta(list_id, add=None, remove=None):
+    """Append contacts and/or remove contacts matched by email or phone."""
+    removed = set()
+    with record_lock('contact-lists', list_id):
+        meta = _contactlists_apply_delta(list_id, add, remove, removed)
+    if meta and (add or removed):
+        contact_index.discard(removed, 'list:' + list_id)
+        for contact in add or []:
+            contact_index.add(contact, 'list:' + list_id)
+        contact_index.save()
+    return meta
+
+def _contactlists_apply_delta(list_id, add, remove, removed):
+    # Fills `removed` with the identity keys no remaining member has
+    meta = contactlists_get_meta(list_id)
+    if meta is None:
+        return None
+    count = meta.get('contactCount', 0)
+    with storage.transaction():
+        if remove:
+            remove_keys = set()
+            for r in remove:
+                remove_keys |= contact_identity_keys(r)
+            kept, kept_keys = [], set()
+            for c in contactlists_iter_contacts(list_id):
+                keys = contact_identity_keys(c)
+                if keys & remove_keys:
+                    removed |= keys
+                else:
+                    kept.append(contact_to_row(c))
+                    kept_keys |= keys
+            removed -= kept_keys
+            count = storage.rows_replace('contact-lists', list_id, kept)
+        if add:
+            count += storage.rows_append('contact-lists', list_id, [contact_to_row(c) for c in add])
+        meta['contactCount'] = count
+        meta['updatedAt'] = datetime.utcnow().isoformat() + 'Z'
+        storage.put('contact-lists', list_id, meta)
+    return meta
+
 def contactlists_delete(list_id):
-    path = os.path.join(CONTACTLISTS_DIR, f'{list_id}.json')
-    if os.path.exists(path):
-        os.remove(path)
+    keys = set()
+    for contact in contactlists_iter_contacts(list_id):
+        keys |= contact_identity_keys(contact)
+    if storage.delete('contact-lists', list_id):
+        storage.rows_delete('contact-lists', list_id)
+        contact_index.discard(keys, 'list:' + list_id)
+        contact_index.save()
         return True
     return False
 
 
+# ─── Imported Lead Storage ────────────────────────────────────
+def leads_append(leads):
+    """Write new leads, or new versions of existing leads."""
+    if leads:
+        storage.put_many('leads', [(lead['id'], lead) for lead in leads])
+
+def leads_get_by_id(lead_id):
+    return storage.get('leads', lead_id)
+
+def leads_iter_imported():
+    return storage.list('leads')
+
+
+# ─── Lead Analytics ───────────────────────────────────────────
+LEAD_STATS_DIMENSIONS = ('company', 'location', 'jobTitle', 'status')
+LEAD_STATS_BUCKETS = ('day', 'week', 'month')
+LEAD_STATS_TOP = 20
+# Column order of the rows in leads-data.json
+STATIC_LEAD_FIELDS = ('name', 'email', 'phone', 'company', 'jobTitle', 'location')
+
+def lead_arrival_day(lead):
+    """YYYY-MM-DD a lead arrived: LinkedIn submittedAt (ms or ISO), else createdAt."""
+    submitted = lead.get('submittedAt')
+    if isinstance(submitted, (int, float)):
+        return datetime.utcfromtimestamp(submitted / 1000).strftime('%Y-%m-%d')
+    return (submitted or lead.get('createdAt') or '')[:10]
+
+def lead_day_bucket(day, bucket):
+    if bucket == 'month':
+        return day[:7]
+    if bucket == 'week':
+        d = datetime.strptime(day, '%Y-%m-%d').date()
+        return d.fromordinal(d.toordinal() - d.weekday()).isoformat()
+    return day
+
+
+class LeadStats:
+    """Columnar in-memory copy of the lead rows behind /api/leads/stats.
+
+    Every dimension (and the arrival day) is an array of integer codes with
+    a per-column dictionary of values, so filters compare small ints instead
+    of re-reading lead JSON. Unfiltered counts per value are maintained as
+    rows change. Imported leads are refreshed from the storage change
+    sequence and the static leads-data.json rows when the file's mtime
+    changes; the live LinkedIn feed is proxied, not stored, and is not
+    included.
+    """
+
+    COLUMNS = LEAD_STATS_DIMENSIONS + ('day',)
+
+    def __init__(self, static_path):
+        self.lock = threading.Lock()
+        self.static_path = static_path
+        self.static_mtime = None
+        self.static_count = 0
+        self.seq = None
+        self.rows = {}
+        self.alive = bytearray()
+        self.values = {col: [] for col in self.COLUMNS}
+        self.codes = {col: {} for col in self.COLUMNS}
+        self.columns = {col: array('I') for col in self.COLUMNS}
+        self.counts = {col: collections.Counter() for col in self.COLUMNS}
+
+    def _code(self, col, value):
+        code = self.codes[col].get(value)
+        if code is None:
+            code = self.codes[col][value] = len(self.values[col])
+            self.values[col].append(value)
+        return code
+
+    def _set(self, key, lead):
+        fields = {col: str(lead.get(col) or '').strip() for col in LEAD_STATS_DIMENSIONS}
+        fields['status'] = fields['status'] or 'New'
+        fields['day'] = lead_arrival_day(lead)
+        row = self.rows.get(key)
+        if row is None:
+            row = self.rows[key] = len(self.alive)
+            self.alive.append(1)
+            for col in self.COLUMNS:
+                self.columns[col].append(0)
+        else:
+            for col in self.COLUMNS:
+                self.counts[col][self.columns[col][row]] -= 1
+        for col in self.COLUMNS:
+            code = self._code(col, fields[col])
+            self.columns[col][row] = code
+            self.counts[col][code] += 1
+
+    def _remove(self, key):
+        row = self.rows.pop(key, None)
+        if row is None:
+            return
+        self.alive[row] = 0
+        for col in self.COLUMNS:
+            self.counts[col][self.columns[col][row]] -= 1
+
+    def _refresh(self):
+        # Called with self.lock held
+        try:
+            mtime = os.path.getmtime(self.static_path)
+        except OSError:
+            mtime = None
+        if mtime != self.static_mtime:
+            rows = []
+            if mtime is not None:
+                with open(self.static_path) as f:
+                    rows = json.load(f)
+            for i, row in enumerate(rows):
+                self._set(f'static:{i}', dict(zip(STATIC_LEAD_FIELDS, row)))
+            for i in range(len(rows), self.static_count):
+                self._remove(f'static:{i}')
+            self.static_mtime, self.static_count = mtime, len(rows)
+
+        seq = storage.change_seq()
+        if seq == self.seq:
+            return
+        if self.seq is None or self.seq > seq:
+            # First load, or the store went backwards (restore): reload imported leads
+            for key in [k for k in self.rows if not k.startswith('static:')]:
+                self._remove(key)
+            for lead in leads_iter_imported():
+                self._set(lead['id'], lead)
+            self.seq = seq
+            return
+        upserted, deleted, seq = storage.changes_since('leads', self.seq)
+        for key in upserted:
+            lead = leads_get_by_id(key)
+            if lead is None:
+                self._remove(key)
+            else:
+                self._set(key, lead)
+        for key in deleted:
+            self._remove(key)
+        self.seq = seq
+
+    def _match(self, filters, date_from, date_to):
+        """Row numbers passing every filter ({column: set of values}) and the date range."""
+        wanted = {}
+        for col, values in filters.items():
+            wanted[col] = {self.codes[col][v] for v in values if v in self.codes[col]}
+            if not wanted[col]:
+                return []
+        if date_from or date_to:
+            wanted['day'] = {code for code, day in enumerate(self.values['day'])
+                             if day and (not date_from or day >= date_from) and (not date_to or day <= date_to)}
+        matched = [row for row, alive in enumerate(self.alive) if alive]
+        # Most selective filter first, so later scans touch fewer rows
+        for col, codes in sorted(wanted.items(), key=lambda item: len(item[1])):
+            column = self.columns[col]
+            matched = [row for row in matched if column[row] in codes]
+        return matched
+
+    def stats(self, filters=None, date_from='', date_to='', bucket='day', top=LEAD_STATS_TOP):
+        filters = {col: set(v) for col, v in (filters or {}).items() if v}
+        with self.lock:
+            self._refresh()
+            if filters or date_from or date_to:
+                matched = self._match(filters, date_from, date_to)
+                counts = {col: collections.Counter(self.columns[col][row] for row in matched)
+                          for col in self.COLUMNS}
+                total = len(matched)
+            else:
+                counts = {col: +self.counts[col] for col in self.COLUMNS}
+                total = len(self.rows)
+            values = {col: self.values[col] for col in self.COLUMNS}
+        by = {}
+        for col in LEAD_STATS_DIMENSIONS:
+            ranked = counts[col].most_common(top or None)
+            by[col] = [{'value': values[col][code], 'count': n} for code, n in ranked]
+        arrivals = collections.Counter()
+        undated = 0
+        for code, n in counts['day'].items():
+            day = values['day'][code]
+            if day:
+                arrivals[lead_day_bucket(day, bucket)] += n
+            else:
+                undated += n
+        return {
+            'total': total,
+            'by': by,
+            'arrivals': [{'bucket': b, 'count': n} for b, n in sorted(arrivals.items())],
+            'undated': undated,
+            'bucket': bucket
+        }
+
+
+lead_stats = LeadStats(STATIC_LEADS_FILE)
+
+
+# ─── Contact Dedup Index ──────────────────────────────────────
+class ContactIndex:
+    """Persistent map of contact identity keys to the record that owns them.
+
+    Keys are 'p:<phone in sanitize_wa_phone form>' and 'e:<lowercased email>'.
+    Values are a lead id, or 'list:<listId>' / 'conv:<phone>' for contacts
+    known only as a list member or a WhatsApp conversation. It is persisted
+    as the 'indexes/contacts' row stream of [key, ref] pairs; the last pair
+    for a key wins, and a null ref drops the key. Other worker processes' saves are picked up by reading
+    the stream from where this process left off.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = None
+        self.pending = []
+        self.cursor = 0
+        self.version = None
+        self.generation = None
+
+    def _load(self):
+        # Called with self.lock held
+        generation = shared.get('contact-index-rebuild')
+        if self.entries is None or generation != self.generation:
+            if 'contacts' not in storage.row_keys('indexes'):
+                self._rebuild()
+                return
+            self.entries = {}
+            self.cursor = 0
+            self.version = None
+            self.generation = generation
+        version = shared.get('contact-index')
+        if version != self.version:
+            self.version = version
+            rows, self.cursor = storage.rows_read_from('indexes', 'contacts', self.cursor)
+            for key, ref in rows:
+                if ref is None:
+                    self.entries.pop(key, None)
+                else:
+                    self.entries[key] = ref
+
+    def _rebuild(self):
+        # Called with self.lock held
+        self.entries = {}
+        self.pending = []
+        for phone in itertools.chain(storage.keys('conversations'), conversation_archive.phones()):
+            self._set({'phone': phone}, 'conv:' + phone)
+        for data in storage.list('contact-lists'):
+            # A legacy list is read as it is; splitting it takes the record
+            # lock, which is taken before this index's lock elsewhere
+            contacts = data['contacts'] if 'contacts' in data else contactlists_iter_contacts(data['id'])
+            for contact in contacts or []:
+                self._set(contact, 'list:' + data['id'])
+        for lead in leads_iter_imported():
+            self._set(lead, lead['id'])
+        self.pending = []
+        storage.rows_replace('indexes', 'contacts', ([key, ref] for key, ref in self.entries.items()))
+        self.version = shared.get('contact-index')
+        _, self.cursor = storage.rows_read_from('indexes', 'contacts')
+        self.generation = shared.bump('contact-index-rebuild')
+
+    def _set(self, contact, ref):
+        for key in contact_identity_keys(contact):
+            current = self.entries.get(key)
+            # A lead id always wins over a list/conversation reference
+            if current == ref or (current and ':' not in current and ':' in ref):
+                continue
+            self.entries[key] = ref
+            self.pending.append([key, ref])
+
+    def lookup(self, contact):
+        """Return the ref matching the contact's phone or email, preferring leads."""
+        with self.lock:
+            self._load()
+            refs = [self.entries[k] for k in sorted(contact_identity_keys(contact)) if k in self.entries]
+        leads = [r for r in refs if ':' not in r]
+        return (leads or refs or [None])[0]
+
+    def add(self, contact, ref):
+        with self.lock:
+            self._load()
+            self._set(contact, ref)
+
+    def discard(self, keys, ref):
+        """Drop those identity keys that point at ref."""
+        with self.lock:
+            self._load()
+            for key in keys:
+                if self.entries.get(key) == ref:
+                    del self.entries[key]
+                    self.pending.append([key, None])
+
+    def save(self):
+        with self.lock:
+            pending, self.pending = self.pending, []
+        if pending:
+            storage.rows_append('indexes', 'contacts', pending)
+            shared.bump('contact-index')
+
+    def rebuild(self):
+        with self.lock:
+            self._rebuild()
+            return len(self.entries)
+
+
+contact_index = ContactIndex()
+
+
+# ─── Message Search Index ─────────────────────────────────────
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+SEARCH_SNIPPET_CHARS = 80
+_SEARCH_TOKEN_RE = re.compile(r'\w+')
+
+def search_tokens(text):
+    return _SEARCH_TOKEN_RE.findall((text or '').lower())
+
+
+class MessageSearchIndex:
+    """In-memory inverted index over conversation messages.
+
+    Every message is one document (its text plus the sender's contactName);
+    every conversation adds one more for its leadName, with an empty message
+    id. Postings are compact arrays of (doc id, term frequency) per term and
+    hits are ranked with BM25, newest first on ties; each document's length
+    normalisation is fixed when it is indexed, against the average length at
+    that point. The indexed documents
+    are persisted as the 'indexes/messages' row stream of
+    [phone, messageId, timestamp, text, name] and re-tokenized on load;
+    rows saved by other worker processes are indexed on next use.
+    """
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.docs = None
+        self.pending = []
+        self.cursor = 0
+        self.version = None
+        self.generation = None
+
+    def _reset(self):
+        self.docs = []
+        self.ids = set()
+        self.norms = array('f')
+        self.postings = {}
+        self.total_length = 0
+
+    def _load(self):
+        # Called with self.lock held
+        generation = shared.get('message-index-rebuild')
+        if self.docs is None or generation != self.generation:
+            if 'messages' not in storage.row_keys('indexes'):
+                self._rebuild()
+                return
+            self._reset()
+            self.cursor = 0
+            self.version = None
+            self.generation = generation
+        version = shared.get('message-index')
+        if version != self.version:
+            self.version = version
+            rows, self.cursor = storage.rows_read_from('indexes', 'messages', self.cursor)
+            for row in rows:
+                self._index(row)
+
+    def _rebuild(self):
+        # Called with self.lock held
+        self._reset()
+        self.pending = []
+        for phone in storage.keys('conversations'):
+            # Not convs_get_by_phone: restoring re-enters this index. Nor
+            # _conv_read_meta: a legacy conversation is read as it is, since
+            # splitting it takes the record lock, which is taken before this
+            # index's lock elsewhere
+            conv = storage.get('conversations', phone)
+            if conv is None:
+                continue
+            messages = conv.pop('messages', None)
+            if messages is None:
+                messages = storage.rows_iter('messages', conv['phone'])
+            self._add_conversation(conv)
+            for message in messages:
+                if '_update' not in message:
+                    self._add_message(conv['phone'], message)
+        # Archived conversations stay searchable; a hit restores them
+        for conv, messages in conversation_archive.records():
+            self._add_conversation(conv)
+            for message in messages:
+                self._add_message(conv['phone'], message)
+        self.pending = []
+        storage.rows_replace('indexes', 'messages', self.docs)
+        self.version = shared.get('message-index')
+        _, self.cursor = storage.rows_read_from('indexes', 'messages')
+        self.generation = shared.bump('message-index-rebuild')
+
+    def _index(self, row):
+        phone, msg_id, _, text, name = row
+        key = msg_id or 'conv:' + phone
+        if key in self.ids:
+            return False
+        self.ids.add(key)
+        doc_id = len(self.docs)
+        self.docs.append(row)
+        counts = collections.Counter(search_tokens(text) + search_tokens(name))
+        for term, tf in counts.items():
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = self.postings[term] = (array('I'), array('I'))
+            posting[0].append(doc_id)
+            posting[1].append(tf)
+        length = sum(counts.values())
+        self.total_length += length
+        # Documents without tokens (media, empty templates) leave the total at 0
+        avg_length = self.total_length / len(self.docs) or 1
+        self.norms.append(self.K1 * (1 - self.B + self.B * length / avg_length))
+        return True
+
+    def _add_conversation(self, conv):
+        if conv.get('leadName'):
+            row = [conv['phone'], '', conv.get('createdAt', ''), '', conv['leadName']]
+            if self._index(row):
+                self.pending.append(row)
+
+    def _add_message(self, phone, message):
+        row = [phone, message.get('id', ''), message.get('timestamp', ''),
+               message.get('text', ''), message.get('contactName', '')]
+        if row[1] and self._index(row):
+            self.pending.append(row)
+
+    def add_conversation(self, conv):
+        with self.lock:
+            self._load()
+            self._add_conversation(conv)
+
+    def add_message(self, phone, message):
+        with self.lock:
+            self._load()
+            self._add_message(phone, message)
+
+    def save(self):
+        with self.lock:
+            pending, self.pending = self.pending, []
+        if pending:
+            storage.rows_append('indexes', 'messages', pending)
+            shared.bump('message-index')
+
+    def load(self):
+        with self.lock:
+            self._load()
+
+    def rebuild(self):
+        with self.lock:
+            self._rebuild()
+            return len(self.docs)
+
+    def search(self, query, offset=0, limit=SEARCH_PAGE_SIZE):
+        """Return (hits, total) for documents containing every query term."""
+        terms = sorted(set(search_tokens(query)))
+        if not terms:
+            return [], 0
+        with self.lock:
+            self._load()
+            postings = [self.postings.get(t) for t in terms]
+            if not all(postings):
+                return [], 0
+            n, k1, norms = len(self.docs), self.K1 + 1, self.norms
+            postings.sort(key=lambda p: len(p[0]))
+            # Score the rarest term's documents, then keep those every other term has
+            scores = None
+            for doc_ids, tfs in postings:
+                idf = math.log(1 + (n - len(doc_ids) + 0.5) / (len(doc_ids) + 0.5)) * k1
+                if scores is None:
+                    scores = {d: idf * tf / (tf + norms[d]) for d, tf in zip(doc_ids, tfs)}
+                else:
+                    scores = {d: scores[d] + idf * tf / (tf + norms[d]) for d, tf in zip(doc_ids, tfs) if d in scores}
+                if not scores:
+                    return [], 0
+            top = heapq.nlargest(offset + limit, scores.items(),
+                                 key=lambda item: (item[1], self.docs[item[0]][2]))
+            page = [(self.docs[doc_id], score) for doc_id, score in top[offset:]]
+            total = len(scores)
+        hits = []
+        for (phone, msg_id, timestamp, text, name), score in page:
+            if not msg_id:
+                field = 'leadName'
+            else:
+                field = 'text' if set(terms) & set(search_tokens(text)) else 'contactName'
+            hits.append({
+                'phone': phone,
+                'messageId': msg_id or None,
+                'timestamp': timestamp,
+                'field': field,
+                'snippet': search_snippet(text if field == 'text' else name, terms),
+                'score': round(score, 4)
+            })
+        return hits, total
+
+
+def search_snippet(text, terms, width=SEARCH_SNIPPET_CHARS):
+    """Up to `width` characters of text around the first matching term."""
+    text = ' '.join((text or '').split())
+    if len(text) <= width:
+        return text
+    lowered = text.lower()
+    positions = [m.start() for t in terms for m in [re.search(r'\b' + re.escape(t), lowered)] if m]
+    start = max(0, min(positions, default=0) - width // 4)
+    end = min(len(text), start + width)
+    start = max(0, end - width)
+    return ('…' if start else '') + text[start:end] + ('…' if end < len(text) else '')
+
+
+message_index = MessageSearchIndex()
+
+
+# ─── Import Job Storage ───────────────────────────────────────
+def import_jobs_get_by_id(job_id):
+    return storage.get('import-jobs', job_id)
+
+def import_jobs_save(job):
+    storage.put('import-jobs', job['id'], job)
+    return job
+
+
 # ─── Email Tracking Storage ───────────────────────────────────
+EMPTY_STATS = {'sent': 0, 'opened': 0, 'clicked': 0, 'bounced': 0}
+
+# 1x1 transparent GIF served by the open-tracking pixel
+TRACKING_PIXEL_GIF = base64.b64decode('R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7')
+
+
+def _tracking_key():
+    if TRACKING_SECRET:
+        return TRACKING_SECRET.encode()
+    path = os.path.join(DATA_DIR, 'tracking-secret')
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        with open(path, 'rb') as f:
+            return f.read().strip()
+    key = os.urandom(32).hex().encode()
+    with os.fdopen(fd, 'wb') as f:
+        f.write(key)
+        f.flush()
+        os.fsync(f.fileno())
+    return key
+
+TRACKING_KEY = _tracking_key()
+
+def tracking_signature(campaign_id, recipient, url=''):
+    message = '\n'.join((campaign_id, recipient.strip().lower(), url)).encode()
+    return hmac.new(TRACKING_KEY, message, hashlib.sha256).hexdigest()[:32]
+
+def tracking_url(kind, campaign_id, recipient, url=''):
+    """Signed path of an open pixel (kind 'open') or click redirect ('click') for one recipient."""
+    params = {'r': recipient}
+    if kind == 'click':
+        params['url'] = url
+    params['sig'] = tracking_signature(campaign_id, recipient, url if kind == 'click' else '')
+    return f'/api/track/{kind}/{campaign_id}?{urlencode(params)}'
+
 def tracking_get():
-    if not os.path.exists(TRACKING_FILE):
-        return {}
-    with open(TRACKING_FILE) as f:
-        return json.load(f)
+    return tracker.snapshot()
+
+def tracking_load():
+    return storage.get_singleton('email-tracking', {})
 
 def tracking_save(data):
-    with open(TRACKING_FILE, 'w') as f:
-        json.dump(data, f, indent=2)
+    storage.put_singleton('email-tracking', data)
 
 def tracking_update_campaign(campaign_id, stats):
-    tracking = tracking_get()
-    tracking[campaign_id] = stats
-    tracking_save(tracking)
+    tracker.set_campaign(campaign_id, stats)
+
+
+class TrackingAggregator:
+    """Write-behind open/click counters per campaign.
+
+    Pixel and click hits only touch in-memory state under a lock; a background
+    thread persists the counters (and the per-campaign sets of recipients used
+    for unique counts) on an interval or once enough events have piled up.
+    What this process counted since its last flush is kept apart and merged
+    into the stored counters under a lock, so worker processes add up
+    instead of overwriting each other; a shared version tells the others to
+    reload.
+    """
+
+    def __init__(self, flush_interval, flush_every):
+        self.flush_interval = flush_interval
+        self.flush_every = flush_every
+        self.lock = threading.Lock()
+        self.stats = None
+        self.recipients = None
+        self.version = None
+        self.counts = {}
+        self.uniques = {}
+        self.overrides = {}
+        self.pending = 0
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    def _read(self):
+        try:
+            stats = tracking_load()
+        except Exception as e:
+            logger.error(f'Failed to read email tracking: {e}')
+            stats = {}
+        recipients = {}
+        try:
+            raw = storage.get_singleton('email-tracking-recipients', {})
+            for campaign_id, kinds in raw.items():
+                recipients[campaign_id] = {k: set(v) for k, v in kinds.items()}
+        except Exception as e:
+            logger.error(f'Failed to read tracking recipients: {e}')
+        return stats, recipients
+
+    @staticmethod
+    def _merge(stats, recipients, counts, uniques, overrides):
+        """Apply unflushed changes to stored counters, in place."""
+        for campaign_id, deltas in counts.items():
+            current = stats.setdefault(campaign_id, dict(EMPTY_STATS))
+            for key, n in deltas.items():
+                current[key] = current.get(key, 0) + n
+        for campaign_id, kinds in uniques.items():
+            current = stats.setdefault(campaign_id, dict(EMPTY_STATS))
+            for kind, new in kinds.items():
+                seen = recipients.setdefault(campaign_id, {}).setdefault(kind, set())
+                added = new - seen
+                seen |= added
+                current[kind] = current.get(kind, 0) + len(added)
+        for campaign_id, values in overrides.items():
+            stats.setdefault(campaign_id, dict(EMPTY_STATS)).update(values)
+
+    def _load(self):
+        # Called with self.lock held
+        version = shared.get('email-tracking')
+        if self.stats is not None and version == self.version:
+            return
+        self.version = version
+        self.stats, self.recipients = self._read()
+        self._merge(self.stats, self.recipients, self.counts, self.uniques, self.overrides)
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name='tracking-flush', daemon=True)
+            self.thread.start()
+            atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            self.flush()
+
+    def record(self, campaign_id, kind, recipient=''):
+        """Count an 'opened' or 'clicked' event; unique per recipient."""
+        total_key = 'totalOpens' if kind == 'opened' else 'totalClicks'
+        with self.lock:
+            self._load()
+            stats = self.stats.setdefault(campaign_id, dict(EMPTY_STATS))
+            counts = self.counts.setdefault(campaign_id, collections.Counter())
+            stats[total_key] = stats.get(total_key, 0) + 1
+            counts[total_key] += 1
+            if recipient:
+                seen = self.recipients.setdefault(campaign_id, {}).setdefault(kind, set())
+                if recipient not in seen:
+                    seen.add(recipient)
+                    stats[kind] = stats.get(kind, 0) + 1
+                    self.uniques.setdefault(campaign_id, {}).setdefault(kind, set()).add(recipient)
+            else:
+                stats[kind] = stats.get(kind, 0) + 1
+                counts[kind] += 1
+            self.pending += 1
+            if self.pending >= self.flush_every:
+                self.wakeup.set()
+
+    def set_campaign(self, campaign_id, stats):
+        """Overwrite sent/bounced for a campaign, keeping tracked opens/clicks."""
+        with self.lock:
+            self._load()
+            current = self.stats.setdefault(campaign_id, dict(EMPTY_STATS))
+            for key, value in stats.items():
+                if key not in ('opened', 'clicked', 'totalOpens', 'totalClicks'):
+                    current[key] = value
+                    self.overrides.setdefault(campaign_id, {})[key] = value
+            self.pending += 1
+        self.wakeup.set()
+
+    def get_campaign(self, campaign_id):
+        with self.lock:
+            self._load()
+            stats = self.stats.get(campaign_id)
+            return dict(stats) if stats else None
+
+    def snapshot(self):
+        with self.lock:
+            self._load()
+            return {cid: dict(stats) for cid, stats in self.stats.items()}
+
+    def flush(self):
+        with self.lock:
+            if not self.pending:
+                return
+            changes = self.counts, self.uniques, self.overrides
+            self.counts, self.uniques, self.overrides = {}, {}, {}
+            self.pending = 0
+        try:
+            with storage.exclusive('email-tracking'):
+                stats, recipients = self._read()
+                self._merge(stats, recipients, *changes)
+                tracking_save(stats)
+                storage.put_singleton('email-tracking-recipients',
+                                      {cid: {k: sorted(v) for k, v in kinds.items()}
+                                       for cid, kinds in recipients.items()})
+                # Campaign listings include opened/clicked, so delta sync must see them change
+                storage.touch('campaigns', sorted(set(changes[0]) | set(changes[1])))
+                version = shared.bump('email-tracking')
+            with self.lock:
+                # What was just written is current: use it rather than re-reading
+                self._merge(stats, recipients, self.counts, self.uniques, self.overrides)
+                self.stats, self.recipients, self.version = stats, recipients, version
+        except Exception as e:
+            logger.error(f'Failed to flush email tracking: {e}')
+            with self.lock:
+                # Keep the changes for the next flush
+                for campaign_id, deltas in changes[0].items():
+                    self.counts.setdefault(campaign_id, collections.Counter()).update(deltas)
+                for campaign_id, kinds in changes[1].items():
+                    for kind, new in kinds.items():
+                        self.uniques.setdefault(campaign_id, {}).setdefault(kind, set()).update(new)
+                for campaign_id, values in changes[2].items():
+                    self.overrides[campaign_id] = {**values, **self.overrides.get(campaign_id, {})}
+                self.pending += 1
+
+
+tracker = TrackingAggregator(TRACKING_FLUSH_INTERVAL, TRACKING_FLUSH_EVERY)
+
+def campaign_stats_with_tracking(campaign_id, stats):
+    """Merge aggregated opened/clicked counts into a campaign's stats dict."""
+    merged = dict(stats or EMPTY_STATS)
+    tracked = tracker.get_campaign(campaign_id)
+    if tracked:
+        for key in ('opened', 'clicked', 'totalOpens', 'totalClicks'):
+            if key in tracked:
+                merged[key] = tracked[key]
+    return merged
 
 
 # ─── Flow Engine (Simulation) ──────────────────────────────────
@@ -451,26 +3163,232 @@ def sanitize_wa_phone(phone):
     return digits
 
 
+# ─── Messaging Analytics ──────────────────────────────────────
+# Buckets are ISO timestamp prefixes, so a from/to timestamp compares by
+# truncation: minute '2026-01-31T09:15', hour '2026-01-31T09', day '2026-01-31'.
+ANALYTICS_GRANULARITIES = {'minute': 16, 'hour': 13, 'day': 10}
+# How long each granularity is kept, in days (None = forever)
+ANALYTICS_RETENTION_DAYS = {'minute': 2, 'hour': 90, 'day': None}
+ANALYTICS_METRICS = ('sent', 'failed', 'delivered', 'read')
+ANALYTICS_DIMENSIONS = ('channel', 'csmName', 'brand', 'campaign')
+# Sends remembered for attributing later webhook statuses to a CSM/campaign
+ANALYTICS_ATTRIBUTION_SIZE = 50000
+
+
+class MessagingAnalytics:
+    """Write-behind send/failure/delivered/read counters per time bucket.
+
+    Each granularity maps a bucket to counts keyed by (channel, csmName,
+    brand, campaign, metric), updated as events happen; queries only add up
+    the buckets in range. Delivery statuses from the webhook carry just the
+    WhatsApp message id, so recent sends are remembered (in memory, and
+    passed to the other worker processes over the bus) to attribute them to
+    the CSM, brand and campaign that sent them. Counts not yet flushed are
+    kept apart and added to the stored ones under a lock, as for email
+    tracking.
+    """
+
+    def __init__(self, flush_interval):
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.buckets = None
+        self.version = None
+        self.changes = {g: {} for g in ANALYTICS_GRANULARITIES}
+        self.sends = collections.OrderedDict()
+        self.dirty = False
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    @staticmethod
+    def _read():
+        buckets = {g: {} for g in ANALYTICS_GRANULARITIES}
+        try:
+            raw = storage.get_singleton('messaging-analytics', {})
+        except Exception as e:
+            logger.error(f'Failed to read messaging analytics: {e}')
+            raw = {}
+        for granularity, stored in raw.items():
+            if granularity not in buckets:
+                continue
+            for bucket, rows in stored.items():
+                counts = buckets[granularity][bucket] = collections.Counter()
+                for *key, n in rows:
+                    counts[tuple(key)] = n
+        return buckets
+
+    @staticmethod
+    def _merge(buckets, changes):
+        for granularity, changed in changes.items():
+            for bucket, counts in changed.items():
+                target = buckets[granularity].get(bucket)
+                if target is None:
+                    target = buckets[granularity][bucket] = collections.Counter()
+                target.update(counts)
+
+    def _load(self):
+        # Called with self.lock held
+        version = shared.get('messaging-analytics')
+        if self.buckets is not None and version == self.version:
+            return
+        self.version = version
+        self.buckets = self._read()
+        self._merge(self.buckets, self.changes)
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name='analytics-flush', daemon=True)
+            self.thread.start()
+            atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            self.flush()
+
+    def record(self, channel, metric, count=1, csm_name='', brand='', campaign='',
+               message_id=None, timestamp=None):
+        """Count `count` events of one metric ('sent', 'failed', 'delivered', 'read')."""
+        if metric not in ANALYTICS_METRICS or count <= 0:
+            return
+        stamp = timestamp or datetime.utcnow().isoformat()
+        with self.lock:
+            self._load()
+            if message_id:
+                if metric == 'sent':
+                    self._remember([message_id, csm_name, brand, campaign])
+                else:
+                    csm_name, brand, campaign = self.sends.get(message_id, (csm_name, brand, campaign))
+            key = (channel, csm_name or '', brand or '', campaign or '', metric)
+            for granularity, width in ANALYTICS_GRANULARITIES.items():
+                for buckets in (self.buckets, self.changes):
+                    counts = buckets[granularity].get(stamp[:width])
+                    if counts is None:
+                        counts = buckets[granularity][stamp[:width]] = collections.Counter()
+                    counts[key] += count
+            self.dirty = True
+        if message_id and metric == 'sent':
+            bus.publish('analytics-send', [message_id, csm_name, brand, campaign])
+
+    def _remember(self, send):
+        # Called with self.lock held
+        message_id, *attribution = send
+        self.sends[message_id] = tuple(attribution)
+        if len(self.sends) > ANALYTICS_ATTRIBUTION_SIZE:
+            self.sends.popitem(last=False)
+
+    def remember_send(self, send):
+        """Attribution for a send made by another worker process."""
+        with self.lock:
+            self._remember(send)
+
+    def record_status(self, status):
+        """Count a WhatsApp webhook status (delivered/read/failed)."""
+        metric = status.get('status', '')
+        # 'sent' statuses were already counted when the send went out
+        if metric == 'sent':
+            return
+        stamp = None
+        if str(status.get('timestamp', '')).isdigit():
+            stamp = datetime.utcfromtimestamp(int(status['timestamp'])).isoformat()
+        self.record('whatsapp', metric, message_id=status.get('id'), timestamp=stamp)
+
+    def query(self, granularity='hour', date_from='', date_to='', filters=None):
+        """Per-bucket metric totals in range, plus totals broken down by each dimension."""
+        width = ANALYTICS_GRANULARITIES[granularity]
+        # Bounds are inclusive and may be coarser than the buckets (to=2026-01
+        # covers every day of January), so buckets are compared by prefix
+        lo, hi = date_from[:width], date_to[:width]
+        filters = filters or {}
+        series = {}
+        totals = dict.fromkeys(ANALYTICS_METRICS, 0)
+        breakdown = {dim: {} for dim in ANALYTICS_DIMENSIONS}
+        with self.lock:
+            self._load()
+            for bucket in sorted(self.buckets[granularity]):
+                if (lo and bucket[:len(lo)] < lo) or (hi and bucket[:len(hi)] > hi):
+                    continue
+                for (*dims, metric), n in self.buckets[granularity][bucket].items():
+                    values = dict(zip(ANALYTICS_DIMENSIONS, dims))
+                    if any(values[d] != v for d, v in filters.items()):
+                        continue
+                    row = series.setdefault(bucket, dict.fromkeys(ANALYTICS_METRICS, 0))
+                    row[metric] += n
+                    totals[metric] += n
+                    for dim, value in values.items():
+                        group = breakdown[dim].setdefault(value, dict.fromkeys(ANALYTICS_METRICS, 0))
+                        group[metric] += n
+        return {
+            'granularity': granularity,
+            'buckets': [{'bucket': b, **row} for b, row in series.items()],
+            'totals': totals,
+            'breakdown': {dim: sorted(({'value': v, **row} for v, row in groups.items()),
+                                      key=lambda r: -r['sent'])
+                          for dim, groups in breakdown.items()}
+        }
+
+    @staticmethod
+    def _prune(buckets):
+        now = datetime.utcnow()
+        for granularity, days in ANALYTICS_RETENTION_DAYS.items():
+            if days is None:
+                continue
+            width = ANALYTICS_GRANULARITIES[granularity]
+            cutoff = (now - timedelta(days=days)).isoformat()[:width]
+            for bucket in [b for b in buckets[granularity] if b < cutoff]:
+                del buckets[granularity][bucket]
+
+    def flush(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            changes, self.changes = self.changes, {g: {} for g in ANALYTICS_GRANULARITIES}
+            self.dirty = False
+        try:
+            with storage.exclusive('messaging-analytics'):
+                buckets = self._read()
+                self._merge(buckets, changes)
+                self._prune(buckets)
+                storage.put_singleton('messaging-analytics', {
+                    g: {b: [[*key, n] for key, n in counts.items()] for b, counts in stored.items()}
+                    for g, stored in buckets.items()})
+                version = shared.bump('messaging-analytics')
+            with self.lock:
+                # What was just written is current: use it rather than re-reading
+                self._merge(buckets, self.changes)
+                self.buckets, self.version = buckets, version
+        except Exception as e:
+            logger.error(f'Failed to flush messaging analytics: {e}')
+            with self.lock:
+                self._merge(self.changes, changes)
+                self.dirty = True
+
+
+messaging_stats = MessagingAnalytics(ANALYTICS_FLUSH_INTERVAL)
+bus.subscribe('analytics-send', messaging_stats.remember_send)
+
+
 # ─── Message Logging ──────────────────────────────────────────
 def log_message(entry):
-    """Append a message send record to the log file."""
+    """Append a message send record to the log."""
+    messaging_stats.record('whatsapp', entry.get('status', ''), csm_name=entry.get('csmName', ''),
+                           brand=entry.get('brand', ''), campaign=entry.get('campaign', ''),
+                           message_id=entry.get('messageId'), timestamp=entry.get('timestamp'))
     try:
-        logs = []
-        if os.path.exists(MSG_LOG_FILE):
-            with open(MSG_LOG_FILE) as f:
-                logs = json.load(f)
-        logs.append(entry)
-        # Keep last 1000 entries
-        if len(logs) > 1000:
-            logs = logs[-1000:]
-        with open(MSG_LOG_FILE, 'w') as f:
-            json.dump(logs, f, indent=2)
+        # Sends run on request, outbox and broadcast threads at once
+        with storage.exclusive('message-log'):
+            logs = storage.get_singleton('message-log', [])
+            logs.append(entry)
+            # Keep last 1000 entries
+            if len(logs) > 1000:
+                logs = logs[-1000:]
+            storage.put_singleton('message-log', logs)
     except Exception as e:
         logger.error(f'Failed to write message log: {e}')
 
 
 # ─── WhatsApp API Calls ────────────────────────────────────────
-def wa_send_text(phone, text, lead_name='', csm_name='', retries=2):
+def wa_send_text(phone, text, lead_name='', csm_name='', retries=2, campaign=''):
     """Send a WhatsApp text message via the single Koenig Solutions Brand Account.
 
     All messages are sent from the single Koenig WhatsApp Business number
@@ -482,7 +3400,27 @@ def wa_send_text(phone, text, lead_name='', csm_name='', retries=2):
         lead_name: Name of the lead (for logging)
         csm_name: CSM assigned to this lead (for logging/tracking only)
         retries: Number of retry attempts on failure
+        campaign: Broadcast/campaign id the send belongs to (for analytics)
     """
+    # Truncate message if over WhatsApp limit
+    if len(text) > 4096:
+        text = text[:4093] + '...'
+    return _wa_send(phone, {'type': 'text', 'text': {'body': text}}, text[:100],
+                    lead_name, csm_name, retries, campaign)
+
+
+def wa_send_template(phone, template_name, language='en', params=None, lead_name='', csm_name='',
+                     retries=2, campaign=''):
+    """Send an approved WhatsApp message template; params fill its body {{1}}, {{2}}, ..."""
+    template = {'name': template_name, 'language': {'code': language}}
+    if params:
+        template['components'] = [{'type': 'body', 'parameters': [{'type': 'text', 'text': str(p)} for p in params]}]
+    preview = f"[Template: {template_name}] {' | '.join(str(p) for p in params or [])}".strip()
+    return _wa_send(phone, {'type': 'template', 'template': template}, preview[:100],
+                    lead_name, csm_name, retries, campaign)
+
+
+def _wa_send(phone, message, preview, lead_name, csm_name, retries, campaign):
     if not WA_ACCESS_TOKEN:
         return {'error': f'WhatsApp API not configured. Add WHATSAPP_ACCESS_TOKEN to .env file.', 'simulated': True}
 
@@ -494,18 +3432,13 @@ def wa_send_text(phone, text, lead_name='', csm_name='', retries=2):
     # Sanitize recipient phone
     clean_phone = sanitize_wa_phone(phone)
     if not clean_phone or len(clean_phone) < 10:
-        return {'error': f'Invalid phone number: {phone}'}
-
-    # Truncate message if over WhatsApp limit
-    if len(text) > 4096:
-        text = text[:4093] + '...'
+        return {'error': f'Invalid phone number: {phone}', 'retryable': False}
 
     url = f'https://graph.facebook.com/{WA_API_VERSION}/{sender_id}/messages'
     payload = json.dumps({
         'messaging_product': 'whatsapp',
         'to': clean_phone,
-        'type': 'text',
-        'text': {'body': text}
+        **message
     }).encode()
     headers = {
         'Authorization': f'Bearer {WA_ACCESS_TOKEN}',
@@ -513,6 +3446,7 @@ def wa_send_text(phone, text, lead_name='', csm_name='', retries=2):
     }
 
     last_error = None
+    retryable = True
     for attempt in range(retries + 1):
         try:
             req = urllib.request.Request(url, data=payload, headers=headers)
@@ -526,9 +3460,10 @@ def wa_send_text(phone, text, lead_name='', csm_name='', retries=2):
                     'leadName': lead_name,
                     'csmName': csm_name,
                     'brand': WA_BRAND_NAME,
+                    'campaign': campaign,
                     'messageId': msg_id,
                     'status': 'sent',
-                    'textPreview': text[:100]
+                    'textPreview': preview
                 })
                 return result
         except urllib.error.HTTPError as e:
@@ -543,6 +3478,7 @@ def wa_send_text(phone, text, lead_name='', csm_name='', retries=2):
             if e.code == 429 or e.code >= 500:
                 time.sleep(1 * (attempt + 1))  # Exponential backoff
                 continue
+            retryable = False
             break  # Don't retry on 4xx client errors (except 429)
         except Exception as e:
             last_error = str(e)
@@ -556,11 +3492,885 @@ def wa_send_text(phone, text, lead_name='', csm_name='', retries=2):
         'leadName': lead_name,
         'csmName': csm_name,
         'brand': WA_BRAND_NAME,
+        'campaign': campaign,
         'status': 'failed',
         'error': last_error,
-        'textPreview': text[:100]
+        'textPreview': preview
+    })
+    return {'error': last_error, 'retryable': retryable}
+
+
+# ─── Outbound Message Queue ───────────────────────────────────
+class Outbox:
+    """Disk-backed queue of outgoing WhatsApp texts, drained by worker threads.
+
+    Each queued message is an 'outbox' document written (durably) before the
+    request returns. Workers make one send attempt at a time; a retryable
+    failure reschedules the item with exponential backoff, persisted in
+    nextAttemptAt, so retries continue after a restart. The conversation
+    message moves queued -> sent (or failed); delivered/read then arrive
+    through the webhook as usual. A successful send is first recorded on the
+    item (status 'sent' plus waMessageId), so it is never sent again, and the
+    item is removed once the conversation is updated; failed ones stay for
+    inspection. With worker processes every worker drains the queue. A
+    worker claims an item under its record lock (status 'sending', with
+    nextAttemptAt OUTBOX_CLAIM_SECONDS ahead) and takes the lock again only
+    to record the outcome, never across the send or the conversation
+    update. A claim that runs out, because its worker died mid-send, is
+    sent again (at-least-once).
+    """
+
+    def __init__(self, workers):
+        self.workers = workers
+        self.cond = threading.Condition()
+        self.due = []
+        self.pending = set()
+        self.threads = []
+
+    def start(self):
+        if self.threads:
+            return
+        for status in ('queued', 'sending', 'sent'):
+            for item in storage.find('outbox', status=status):
+                self._schedule(item)
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f'outbox-{i}', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def enqueue(self, phone, text, lead_id=None, lead_name='', csm_name=''):
+        """Persist a message for sending and add it to the conversation as 'queued'."""
+        now = datetime.utcnow().isoformat() + 'Z'
+        item = {
+            'id': 'out_' + str(int(datetime.utcnow().timestamp() * 1000)) + '_' + uuid.uuid4().hex[:4],
+            'phone': phone,
+            'text': text,
+            'leadName': lead_name,
+            'csmName': csm_name,
+            'messageId': 'msg_' + str(int(datetime.utcnow().timestamp() * 1000)) + '_' + uuid.uuid4().hex[:4],
+            'status': 'queued',
+            'attempts': 0,
+            'nextAttemptAt': time.time(),
+            'lastError': None,
+            'createdAt': now,
+            'updatedAt': now
+        }
+        # Outbox first: a crash before the conversation write still sends the message
+        storage.put('outbox', item['id'], item)
+        convs_create_or_get(phone, lead_id, lead_name)
+        convs_add_message(phone, {
+            'id': item['messageId'],
+            'direction': 'outgoing',
+            'type': 'text',
+            'text': text,
+            'status': 'queued',
+            'outboxId': item['id']
+        })
+        self._schedule(item)
+        return item
+
+    def _schedule(self, item):
+        with self.cond:
+            if item['id'] in self.pending:
+                return
+            self.pending.add(item['id'])
+            heapq.heappush(self.due, (item.get('nextAttemptAt') or 0, item['id']))
+            self.cond.notify()
+
+    def _next(self):
+        with self.cond:
+            while True:
+                if self.due:
+                    wait = self.due[0][0] - time.time()
+                    if wait <= 0:
+                        item_id = heapq.heappop(self.due)[1]
+                        self.pending.discard(item_id)
+                        return item_id
+                    self.cond.wait(wait)
+                else:
+                    self.cond.wait()
+
+    def _run(self):
+        while True:
+            item_id = self._next()
+            try:
+                self._attempt(item_id)
+            except Exception as e:
+                logger.error(f'Outbox {item_id} attempt failed: {e}')
+
+    def _save(self, item, **fields):
+        item.update(fields, updatedAt=datetime.utcnow().isoformat() + 'Z')
+        storage.put('outbox', item['id'], item)
+
+    def _attempt(self, item_id):
+        with record_lock('outbox', item_id):
+            item = self._claim(item_id)
+        if item is None:
+            return
+        if item['status'] == 'sending':
+            try:
+                result = wa_send_text(item['phone'], item['text'], lead_name=item.get('leadName', ''),
+                                      csm_name=item.get('csmName', ''), retries=0)
+            except Exception as e:
+                result = {'error': str(e)}
+            with record_lock('outbox', item_id):
+                outcome = self._record(item, result)
+            if outcome == 'failed':
+                convs_update_message(item['phone'], item['messageId'], {'status': 'failed', 'error': item['lastError']})
+            if outcome != 'sent':
+                return
+        try:
+            self._finish(item)
+        except Exception as e:
+            # Already sent: only the bookkeeping is retried
+            with record_lock('outbox', item_id):
+                item = storage.get('outbox', item_id)
+                if item is None:
+                    return
+                self._save(item, nextAttemptAt=time.time() + OUTBOX_RETRY_BASE_SECONDS, lastError=str(e))
+            logger.error(f'Outbox {item_id}: sent, but updating the conversation failed: {e}')
+            self._schedule(item)
+
+    def _claim(self, item_id):
+        """The item if it is due, marked 'sending' unless already sent; call
+        with its record lock held."""
+        item = storage.get('outbox', item_id)
+        if not item or item.get('status') not in ('queued', 'sending', 'sent'):
+            return None
+        if (item.get('nextAttemptAt') or 0) > time.time():
+            # Rescheduled, or claimed by another worker thread or process
+            self._schedule(item)
+            return None
+        if item['status'] != 'sent':
+            self._save(item, status='sending', attempts=item.get('attempts', 0) + 1,
+                       nextAttemptAt=time.time() + OUTBOX_CLAIM_SECONDS)
+        return item
+
+    def _record(self, item, result):
+        """Save the outcome of a send: 'sent', 'queued' (retrying) or 'failed'.
+        Call with the item's record lock held."""
+        if not result.get('error') or result.get('simulated'):
+            wa_id = (result.get('messages') or [{}])[0].get('id')
+            self._save(item, status='sent', waMessageId=wa_id, nextAttemptAt=time.time())
+            return 'sent'
+        if result.get('retryable', True) and item['attempts'] < OUTBOX_MAX_ATTEMPTS:
+            delay = min(OUTBOX_RETRY_BASE_SECONDS * 2 ** (item['attempts'] - 1), OUTBOX_RETRY_MAX_SECONDS)
+            self._save(item, status='queued', nextAttemptAt=time.time() + delay, lastError=result['error'])
+            logger.warning(f"Outbox {item['id']} to {item['phone']}: attempt {item['attempts']} failed, retrying in {delay}s")
+            self._schedule(item)
+            return 'queued'
+        self._save(item, status='failed', lastError=result['error'])
+        logger.error(f"Outbox {item['id']} to {item['phone']} FAILED after {item['attempts']} attempts: {result['error']}")
+        return 'failed'
+
+    def _finish(self, item):
+        status = item.get('lateStatus') or 'sent'
+        convs_update_message(item['phone'], item['messageId'], {'status': status, 'waMessageId': item.get('waMessageId')})
+        with record_lock('outbox', item['id']):
+            current = storage.get('outbox', item['id']) or {}
+            storage.delete('outbox', item['id'])
+        late = current.get('lateStatus')
+        if late and late != status:
+            # Held by note_status while the conversation was being updated
+            convs_update_status(item['phone'], item.get('waMessageId'), late)
+
+    def note_status(self, phone, wa_message_id, status):
+        """Apply a webhook status that matched no conversation message: it can
+        arrive between a send and _finish recording the waMessageId."""
+        item = next(storage.find('outbox', waMessageId=wa_message_id), None) if wa_message_id else None
+        if item is not None:
+            with record_lock('outbox', item['id']):
+                current = storage.get('outbox', item['id'])
+                if current is not None:
+                    if current.get('lateStatus') != 'read':
+                        self._save(current, lateStatus=status)
+                    return
+        if wa_message_id:
+            # No outbox item (any more): it may have finished since the first lookup
+            convs_update_status(phone, wa_message_id, status)
+
+
+outbox = Outbox(OUTBOX_WORKERS)
+
+
+# ─── WhatsApp Broadcasts ──────────────────────────────────────
+# A broadcast sends one text (or approved template) to every contact of a
+# list, rendered per contact with {{name}}, {{company}}, {{email}}, ...
+# Progress is checkpointed in the 'broadcasts' document: `cursor` is the
+# list position before which every contact has been handled. Per-recipient
+# outcomes are appended to the 'broadcast-results' row stream as
+# [index, phone, status, waMessageId or error, timestamp]; the latest row
+# for an index wins. Phones with a 'sent' row are never sent again, so
+# resuming after a pause or crash and retrying failures are both safe.
+# A run holds the lock file broadcast-<id>, so only one worker process runs
+# a broadcast; a pause handled by another worker sets pauseRequested, which
+# the run picks up at its next checkpoint.
+BROADCAST_STATUSES = ('draft', 'running', 'paused', 'completed')
+BROADCAST_CHECKPOINT_EVERY = 25
+BROADCAST_RESULTS_PAGE_SIZE = 100
+
+
+class RateLimiter:
+    """Spaces calls evenly at `rate` per second across threads and worker
+    processes; the next free slot (monotonic clock, in microseconds) is the
+    shared counter `slot`."""
+
+    def __init__(self, rate, slot):
+        self.interval = 1.0 / rate if rate > 0 else 0
+        self.slot = slot
+
+    def acquire(self):
+        with shared.lock:
+            now = time.monotonic()
+            slot = max(now, shared.get(self.slot) / 1e6)
+            shared.set(self.slot, int((slot + self.interval) * 1e6))
+        if slot > now:
+            time.sleep(slot - now)
+
+
+wa_rate_limiter = RateLimiter(BROADCAST_RATE_PER_SECOND, 'wa-send-slot')
+
+
+def broadcast_render(broadcast, contact):
+    """Message text (or template parameters) for one contact."""
+    data = {k: v for k, v in contact.items() if isinstance(v, (str, int, float))}
+    name = contact.get('name', '')
+    if broadcast.get('templateName'):
+        return [interpolate_text(str(p), data, name) for p in broadcast.get('parameters') or []]
+    return interpolate_text(broadcast.get('text', ''), data, name)
+
+
+class BroadcastRun:
+    """One pass over a broadcast's contact list.
+
+    A producer reads contacts from the checkpoint into a bounded queue and
+    BROADCAST_WORKERS threads send them through the shared rate limiter.
+    """
+
+    def __init__(self, broadcast, start, run_lock, already_sent, recorded):
+        self.broadcast = broadcast
+        self.id = broadcast['id']
+        self.start = start
+        self.run_lock = run_lock
+        self.lock = threading.Lock()
+        self.stop = threading.Event()
+        self.queue = collections.deque()
+        self.slots = threading.Semaphore(BROADCAST_WORKERS * 4)
+        self.ready = threading.Condition(self.lock)
+        self.inflight = set()
+        self.next_index = start
+        self.produced_all = False
+        self.handled = 0
+        # Recipients whose outcome an earlier run recorded are passed over
+        # (see _broadcast_compact_results); a phone sent before, or repeated
+        # within the list, is recorded as skipped
+        self.already_sent = already_sent
+        self.recorded = recorded
+        self.claimed = set()
+        # Set by a start that arrives while pausing: None, or its retry flag
+        self.restart = None
+
+    def run(self):
+        workers = [threading.Thread(target=self._work, name=f'broadcast-{self.id}-{i}', daemon=True)
+                   for i in range(BROADCAST_WORKERS)]
+        for w in workers:
+            w.start()
+        try:
+            self._produce()
+        finally:
+            for w in workers:
+                w.join()
+            stats = dict(self.broadcast['stats'])
+            if self.stop.is_set():
+                self._checkpoint(status='paused', pauseRequested=False)
+            else:
+                self._checkpoint(status='completed', completedAt=datetime.utcnow().isoformat() + 'Z')
+            with _broadcast_runs_lock:
+                _broadcast_runs.pop(self.id, None)
+                release_process_lock(self.run_lock)
+                restart = self.restart if self.stop.is_set() else None
+            logger.info(f"Broadcast {self.id} {self.broadcast['status']}: {stats}")
+            if restart is not None:
+                broadcasts_start(self.id, retry=restart)
+
+    def _produce(self):
+        list_id = self.broadcast['contactListId']
+        for offset, contact in enumerate(contactlists_iter_contacts(list_id, self.start)):
+            if self.stop.is_set():
+                break
+            self.slots.acquire()
+            with self.lock:
+                index = self.start + offset
+                self.inflight.add(index)
+                self.next_index = index + 1
+                self.queue.append((index, contact))
+                self.ready.notify()
+        with self.lock:
+            self.produced_all = True
+            self.ready.notify_all()
+
+    def _work(self):
+        while True:
+            with self.lock:
+                while not self.queue and not self.produced_all:
+                    self.ready.wait()
+                if not self.queue:
+                    return
+                index, contact = self.queue.popleft()
+            if self.stop.is_set():
+                # Paused: leave it in flight so the checkpoint stays before it
+                self.slots.release()
+                continue
+            try:
+                self._send(index, contact)
+            except Exception as e:
+                logger.error(f'Broadcast {self.id} recipient {index} failed: {e}')
+            finally:
+                with self.lock:
+                    self.inflight.discard(index)
+                    self.handled += 1
+                    checkpoint = self.handled % BROADCAST_CHECKPOINT_EVERY == 0
+                self.slots.release()
+                if checkpoint:
+                    self._checkpoint()
+
+    def _send(self, index, contact):
+        b = self.broadcast
+        if index in self.recorded:
+            return
+        phone = sanitize_wa_phone(contact.get('phone') or '')
+        if not phone:
+            self._result(index, '', 'skipped', 'no phone number')
+            return
+        with self.lock:
+            duplicate = phone in self.claimed or phone in self.already_sent
+            self.claimed.add(phone)
+        if duplicate:
+            self._result(index, phone, 'skipped', 'duplicate phone number')
+            return
+        rendered = broadcast_render(b, contact)
+        wa_rate_limiter.acquire()
+        if b.get('templateName'):
+            result = wa_send_template(phone, b['templateName'], b.get('language', 'en'), rendered,
+                                      lead_name=contact.get('name', ''), csm_name=b.get('csmName', ''),
+                                      campaign=self.id)
+            text = f"[Template: {b['templateName']}]"
+        else:
+            result = wa_send_text(phone, rendered, lead_name=contact.get('name', ''),
+                                  csm_name=b.get('csmName', ''), campaign=self.id)
+            text = rendered
+        if result.get('error') and not result.get('simulated'):
+            self._result(index, phone, 'failed', result['error'])
+            return
+        wa_id = (result.get('messages') or [{}])[0].get('id')
+        convs_create_or_get(phone, None, contact.get('name', ''))
+        convs_add_message(phone, {
+            'direction': 'outgoing',
+            'type': 'template' if b.get('templateName') else 'text',
+            'text': text,
+            'status': 'sent',
+            'waMessageId': wa_id,
+            'broadcastId': self.id
+        })
+        self._result(index, phone, 'sent', wa_id)
+
+    def _result(self, index, phone, status, detail):
+        storage.rows_append('broadcast-results', self.id,
+                            [[index, phone, status, detail, datetime.utcnow().isoformat() + 'Z']])
+        with self.lock:
+            self.broadcast['stats'][status] += 1
+
+    def _checkpoint(self, **fields):
+        with record_lock('broadcasts', self.id):
+            stored = storage.get('broadcasts', self.id) or {}
+            if stored.get('pauseRequested') and 'pauseRequested' not in fields:
+                self.stop.set()
+                fields['pauseRequested'] = True
+            if 'restartRequested' in stored:
+                # Started from another worker process while pausing
+                self.restart = bool(self.restart) or stored['restartRequested']
+            with self.lock:
+                cursor = min(self.inflight) if self.inflight else self.next_index
+                self.broadcast.update(fields, cursor=cursor, updatedAt=datetime.utcnow().isoformat() + 'Z')
+                doc = json.loads(json.dumps(self.broadcast))
+            storage.put('broadcasts', self.id, doc)
+
+    def progress(self):
+        with self.lock:
+            return dict(self.broadcast['stats']), (min(self.inflight) if self.inflight else self.next_index)
+
+
+_broadcast_runs = {}
+_broadcast_runs_lock = threading.Lock()
+
+
+def broadcasts_get_all():
+    items = [broadcasts_get_by_id(b['id']) for b in storage.list('broadcasts')]
+    items.sort(key=lambda b: b.get('createdAt', ''), reverse=True)
+    return items
+
+def broadcasts_get_by_id(broadcast_id):
+    """The broadcast with live stats when it is running."""
+    run = _broadcast_runs.get(broadcast_id)
+    if run:
+        broadcast = dict(run.broadcast)
+        broadcast['stats'], broadcast['cursor'] = run.progress()
+    else:
+        broadcast = storage.get('broadcasts', broadcast_id)
+        if broadcast is None:
+            return None
+    total = broadcast.get('total', 0)
+    broadcast['progress'] = round(broadcast.get('cursor', 0) / total, 4) if total else 1.0
+    return broadcast
+
+def broadcasts_create(data):
+    now = datetime.utcnow().isoformat() + 'Z'
+    meta = contactlists_get_meta(data['contactListId'])
+    broadcast = {
+        'id': 'bc_' + str(int(datetime.utcnow().timestamp() * 1000)) + '_' + uuid.uuid4().hex[:4],
+        'name': data.get('name') or (meta or {}).get('name', ''),
+        'contactListId': data['contactListId'],
+        'text': data.get('text', ''),
+        'templateName': data.get('templateName', ''),
+        'language': data.get('language', 'en'),
+        'parameters': data.get('parameters') or [],
+        'csmName': data.get('csmName', ''),
+        'status': 'draft',
+        'total': (meta or {}).get('contactCount', 0),
+        'cursor': 0,
+        'stats': {'sent': 0, 'failed': 0, 'skipped': 0},
+        'createdAt': now,
+        'updatedAt': now
+    }
+    storage.put('broadcasts', broadcast['id'], broadcast)
+    return broadcast
+
+def broadcasts_start(broadcast_id, retry=False):
+    """Start or resume a broadcast; retry=True goes over the whole list again,
+    re-sending failures but skipping everyone already sent."""
+    with _broadcast_runs_lock:
+        run = _broadcast_runs.get(broadcast_id)
+        if run:
+            if run.stop.is_set():
+                # Pausing: start again once the in-flight sends are done
+                run.restart = bool(run.restart) or retry
+            return run.broadcast
+        run_lock = try_process_lock(f'broadcast-{broadcast_id}')
+        if run_lock is None:
+            # Running in another worker process; if it is pausing, it starts
+            # again once stopped
+            with record_lock('broadcasts', broadcast_id):
+                broadcast = storage.get('broadcasts', broadcast_id)
+                if broadcast and broadcast.get('pauseRequested'):
+                    broadcast['restartRequested'] = bool(broadcast.get('restartRequested')) or retry
+                    storage.put('broadcasts', broadcast_id, broadcast)
+                    return broadcast
+            if not broadcast or broadcast['status'] == 'running':
+                return broadcast
+            # Paused there just now; its run lock is released right after
+            for _ in range(50):
+                time.sleep(0.1)
+                run_lock = try_process_lock(f'broadcast-{broadcast_id}')
+                if run_lock is not None:
+                    break
+            else:
+                return broadcast
+        broadcast = storage.get('broadcasts', broadcast_id)
+        if broadcast is None or (broadcast['status'] == 'completed' and not retry):
+            release_process_lock(run_lock)
+            return broadcast
+        broadcast['pauseRequested'] = False
+        broadcast.pop('restartRequested', None)
+        if retry:
+            broadcast['cursor'] = 0
+        already_sent, recorded = _broadcast_compact_results(broadcast)
+        meta = contactlists_get_meta(broadcast['contactListId']) or {}
+        broadcast['total'] = meta.get('contactCount', broadcast.get('total', 0))
+        broadcast['status'] = 'running'
+        broadcast.setdefault('startedAt', datetime.utcnow().isoformat() + 'Z')
+        storage.put('broadcasts', broadcast_id, broadcast)
+        run = _broadcast_runs[broadcast_id] = BroadcastRun(broadcast, broadcast['cursor'], run_lock, already_sent, recorded)
+    threading.Thread(target=run.run, name=f'broadcast-{broadcast_id}', daemon=True).start()
+    return broadcast
+
+def broadcasts_pause(broadcast_id):
+    """Stop after in-flight sends finish; the checkpoint is kept for resume."""
+    run = _broadcast_runs.get(broadcast_id)
+    if run:
+        run.stop.set()
+    elif not _broadcast_running_elsewhere(broadcast_id):
+        return False
+    # Stored as well, so a start in another worker process sees the pause
+    with record_lock('broadcasts', broadcast_id):
+        broadcast = storage.get('broadcasts', broadcast_id)
+        if not broadcast or broadcast['status'] != 'running':
+            return run is not None
+        broadcast['pauseRequested'] = True
+        storage.put('broadcasts', broadcast_id, broadcast)
+    return True
+
+def _broadcast_running_elsewhere(broadcast_id):
+    run_lock = try_process_lock(f'broadcast-{broadcast_id}')
+    release_process_lock(run_lock)
+    return run_lock is None
+
+def broadcasts_resume_interrupted():
+    """Restart broadcasts that were running when the process stopped."""
+    for broadcast in storage.find('broadcasts', status='running'):
+        logger.info(f"Resuming broadcast {broadcast['id']} at contact {broadcast.get('cursor', 0)}")
+        broadcasts_start(broadcast['id'])
+
+def _broadcast_compact_results(broadcast):
+    """Rewrite the result stream to one row per recipient in list order,
+    dropping the failures the coming run sends again (those from the cursor
+    on), and recount the stats from it. Every other outcome is carried
+    forward and not recorded again. Returns (phones sent, recipient indexes
+    from the cursor on that keep their outcome)."""
+    latest = {}
+    for row in storage.rows_iter('broadcast-results', broadcast['id']):
+        latest[row[0]] = row
+    cursor = broadcast['cursor']
+    rows = [latest[i] for i in sorted(latest) if latest[i][2] != 'failed' or i < cursor]
+    storage.rows_replace('broadcast-results', broadcast['id'], rows)
+    broadcast['stats'] = {'sent': 0, 'failed': 0, 'skipped': 0}
+    for row in rows:
+        broadcast['stats'][row[2]] += 1
+    return {row[1] for row in rows if row[2] == 'sent'}, {row[0] for row in rows if row[0] >= cursor}
+
+def broadcasts_results(broadcast_id, offset=0, limit=BROADCAST_RESULTS_PAGE_SIZE, status=''):
+    """Return (outcome per recipient, total) for one page. The stream holds one
+    row per recipient (see _broadcast_compact_results), in list order apart
+    from sends completing out of order within a run, so a page is read by
+    position and the total comes from the stats."""
+    broadcast = broadcasts_get_by_id(broadcast_id)
+    if broadcast is None:
+        return [], 0
+    stats = broadcast.get('stats', {})
+    total = stats.get(status, 0) if status else sum(stats.values())
+    rows = storage.rows_iter('broadcast-results', broadcast_id, 0 if status else offset)
+    if status:
+        rows = itertools.islice((row for row in rows if row[2] == status), offset, None)
+    page = [{'index': index, 'phone': phone, 'status': result,
+             'waMessageId' if result == 'sent' else 'error': detail, 'timestamp': timestamp}
+            for index, phone, result, detail, timestamp in itertools.islice(rows, limit)]
+    return page, total
+
+def broadcasts_delete(broadcast_id):
+    if broadcast_id in _broadcast_runs or _broadcast_running_elsewhere(broadcast_id):
+        return False
+    if storage.delete('broadcasts', broadcast_id):
+        storage.rows_delete('broadcast-results', broadcast_id)
+        return True
+    return False
+
+
+# ─── Contact Import ───────────────────────────────────────────
+# Header aliases accepted in CSV uploads, mapped to lead field names
+IMPORT_FIELD_ALIASES = {
+    'full name': 'name', 'fullname': 'name', 'contact name': 'name',
+    'e-mail': 'email', 'email address': 'email', 'mail': 'email',
+    'mobile': 'phone', 'mobile number': 'phone', 'phone number': 'phone',
+    'whatsapp': 'phone', 'whatsapp number': 'phone', 'contact number': 'phone',
+    'company name': 'company', 'organization': 'company', 'organisation': 'company',
+    'job title': 'jobTitle', 'jobtitle': 'jobTitle', 'title': 'jobTitle', 'designation': 'jobTitle',
+    'city': 'location', 'company size': 'companySize', 'assigned to': 'assignedTo',
+}
+
+def normalize_import_row(raw):
+    """Map a CSV/NDJSON row's keys onto lead field names."""
+    contact = {}
+    for key, value in raw.items():
+        if key is None:
+            continue
+        key = str(key).strip()
+        field = IMPORT_FIELD_ALIASES.get(key.lower(), key)
+        if field.lower() in ('first name', 'firstname', 'last name', 'lastname'):
+            continue
+        contact[field] = value.strip() if isinstance(value, str) else value
+    if not contact.get('name'):
+        first = next((str(v).strip() for k, v in raw.items() if k and str(k).strip().lower() in ('first name', 'firstname') and v), '')
+        last = next((str(v).strip() for k, v in raw.items() if k and str(k).strip().lower() in ('last name', 'lastname') and v), '')
+        if first or last:
+            contact['name'] = f'{first} {last}'.strip()
+    return contact
+
+def validate_import_contact(c):
+    """Return an error string for an unusable row, or None."""
+    if not any(c.get(k) for k in ('name', 'email', 'phone')):
+        return 'row has no name, email or phone'
+    email = c.get('email') or ''
+    if email and ('@' not in email or ' ' in email.strip()):
+        return f'invalid email: {email}'
+    phone = c.get('phone') or ''
+    if phone and len(sanitize_wa_phone(phone)) < 10:
+        return f'invalid phone: {phone}'
+    return None
+
+def build_import_lead(c, now):
+    lead_id = 'lead_' + str(int(datetime.utcnow().timestamp() * 1000)) + '_' + uuid.uuid4().hex[:4]
+    return {
+        'id': lead_id,
+        'name': c.get('name', ''),
+        'email': c.get('email', ''),
+        'phone': c.get('phone', ''),
+        'company': c.get('company', ''),
+        'jobTitle': c.get('jobTitle', ''),
+        'location': c.get('location', ''),
+        'source': c.get('source', 'import'),
+        'campaign': c.get('campaign', ''),
+        'status': c.get('status', 'New'),
+        'priority': c.get('priority', 'Medium'),
+        'assignedTo': c.get('assignedTo', ''),
+        'companySize': c.get('companySize', ''),
+        'industry': c.get('industry', ''),
+        'seniority': c.get('seniority', ''),
+        'createdAt': now,
+        'updatedAt': now
+    }
+
+def acknowledge_lead(lead, auto_ack):
+    """Send the auto-acknowledge WhatsApp message for a lead. Returns True if sent."""
+    phone = sanitize_phone(lead.get('phone', ''))
+    if not phone:
+        return False
+    message_text = auto_ack.get('message', 'Hello! Thank you for your interest.')
+    # Replace placeholders in message
+    message_text = message_text.replace('{{name}}', lead.get('name', 'there'))
+    message_text = message_text.replace('{{Name}}', lead.get('name', 'there'))
+    message_text = message_text.replace('{{company}}', lead.get('company', ''))
+    message_text = message_text.replace('{{email}}', lead.get('email', ''))
+    wa_send_text(phone, message_text)
+    convs_create_or_get(phone, lead['id'], lead.get('name', ''))
+    convs_add_message(phone, {
+        'direction': 'outgoing',
+        'type': 'text',
+        'text': message_text,
+        'status': 'sent'
     })
-    return {'error': last_error}
+    return True
+
+
+def merge_lead(existing, contact, overwrite=False):
+    """Fold an imported row into an existing lead.
+
+    With overwrite, non-empty row values replace the lead's; otherwise they
+    only fill fields the lead has empty.
+    """
+    merged = dict(existing)
+    for key, value in contact.items():
+        if key in ('id', 'createdAt') or value in (None, ''):
+            continue
+        if overwrite or not merged.get(key):
+            merged[key] = value
+    merged['updatedAt'] = datetime.utcnow().isoformat() + 'Z'
+    return merged
+
+
+class ContactImportJob:
+    """Validates imported rows and writes leads + list members in batches.
+
+    Rows are fed one at a time with add(); nothing but the current batch is
+    held in memory unless keep_leads is set (used by the JSON endpoint, which
+    still echoes the created leads back to the caller). Each row is checked
+    against contact_index so an existing phone/email is merged, updated or
+    skipped according to the dedupe policy rather than duplicated.
+    """
+
+    def __init__(self, list_name, auto_ack=None, keep_leads=False, batch_size=IMPORT_BATCH_SIZE,
+                 dedupe='merge'):
+        now = datetime.utcnow().isoformat() + 'Z'
+        self.job = {
+            'id': 'imp_' + str(int(datetime.utcnow().timestamp() * 1000)) + '_' + uuid.uuid4().hex[:4],
+            'status': 'running',
+            'listName': list_name,
+            'listId': None,
+            'dedupe': dedupe,
+            'total': 0,
+            'imported': 0,
+            'new': 0,
+            'matched': 0,
+            'merged': 0,
+            # Matched a list member or conversation and became its first lead
+            'promoted': 0,
+            'skipped': 0,
+            'failed': 0,
+            'acknowledged': 0,
+            'errors': [],
+            'startedAt': now,
+            'finishedAt': None
+        }
+        self.auto_ack = auto_ack or {}
+        self.keep_leads = keep_leads
+        self.batch_size = batch_size
+        self.dedupe = dedupe
+        self.batch = {}
+        self.new_ids = set()
+        self.leads = []
+
+    def _ensure_list(self):
+        if not self.job['listId']:
+            contact_list = contactlists_save({'name': self.job['listName'], 'description': '', 'contacts': []})
+            self.job['listId'] = contact_list['id']
+
+    def add(self, raw, row_number=None):
+        self.job['total'] += 1
+        if row_number is None:
+            row_number = self.job['total']
+        if not isinstance(raw, dict):
+            self._error(row_number, 'row is not an object')
+            return
+        contact = normalize_import_row(raw)
+        error = validate_import_contact(contact)
+        if error:
+            self._error(row_number, error)
+            return
+
+        ref = contact_index.lookup(contact) if self.dedupe != 'create' else None
+        if ref is not None:
+            self.job['matched'] += 1
+            if self.dedupe == 'skip':
+                self.job['skipped'] += 1
+                return
+            existing = None
+            if ':' not in ref:
+                existing = self.batch.get(ref) or leads_get_by_id(ref)
+            if existing is not None:
+                lead = merge_lead(existing, contact, overwrite=(self.dedupe == 'update'))
+                # The row may have brought a phone/email the lead lacked
+                contact_index.add(lead, lead['id'])
+                self.batch[lead['id']] = lead
+                self.job['merged'] += 1
+                self._maybe_flush()
+                return
+
+        # New lead — either unseen, or known only as a list member/conversation
+        lead = build_import_lead(contact, datetime.utcnow().isoformat() + 'Z')
+        contact_index.add(lead, lead['id'])
+        self.batch[lead['id']] = lead
+        if ref is None:
+            self.job['new'] += 1
+            self.new_ids.add(lead['id'])
+        else:
+            self.job['promoted'] += 1
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def reject(self, row_number, message):
+        """Count a row that could not be parsed at all."""
+        self.job['total'] += 1
+        self._error(row_number, message)
+
+    def _error(self, row_number, message):
+        self.job['failed'] += 1
+        if len(self.job['errors']) < IMPORT_MAX_ERROR_ROWS:
+            self.job['errors'].append({'row': row_number, 'error': message})
+
+    def flush(self):
+        if not self.batch:
+            return
+        batch = list(self.batch.values())
+        new_ids, self.batch, self.new_ids = self.new_ids, {}, set()
+        self._ensure_list()
+        leads_append(batch)
+        contactlists_apply_delta(self.job['listId'], add=[
+            {'name': l['name'], 'email': l['email'], 'phone': l.get('phone', '')} for l in batch
+        ])
+        contact_index.save()
+        self.job['imported'] += len(batch)
+        # Only brand-new contacts get a WhatsApp acknowledgement
+        if self.auto_ack.get('enabled'):
+            for lead in batch:
+                if lead['id'] in new_ids and lead.get('phone') and acknowledge_lead(lead, self.auto_ack):
+                    self.job['acknowledged'] += 1
+        if self.keep_leads:
+            self.leads.extend(batch)
+
+    def finish(self, status='completed'):
+        self.flush()
+        self._ensure_list()
+        meta = contactlists_get_meta(self.job['listId'])
+        if meta is not None:
+            meta['description'] = f"Imported {self.job['imported']} contacts"
+            contactlists_save(meta)
+        self.job['status'] = status
+        self.job['finishedAt'] = datetime.utcnow().isoformat() + 'Z'
+        import_jobs_save(self.job)
+        return self.job
+
+
+def iter_import_rows(lines, fmt):
+    """Yield (row_number, row) from an iterator of text lines in CSV or NDJSON."""
+    if fmt == 'csv':
+        for row_number, row in enumerate(csv.DictReader(lines), start=1):
+            yield row_number, row
+        return
+    for row_number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield row_number, json.loads(line)
+        except ValueError as e:
+            yield row_number, ValueError(f'invalid JSON: {e}')
+
+
+def _chain_first(first, rest):
+    if first:
+        yield first
+    yield from rest
+
+
+# ─── Streaming JSON ───────────────────────────────────────────
+# Large listings are written while they are serialized instead of being
+# built as one string first. The response body goes out in chunks of about
+# STREAM_CHUNK_SIZE bytes.
+STREAM_CHUNK_SIZE = 64 * 1024
+
+def iter_json(value):
+    """Yield the JSON text of value in pieces.
+
+    Dicts are written key by key; an iterator (such as a generator over the
+    store) is written as an array one item at a time. Lists and items are
+    serialized whole.
+    """
+    if isinstance(value, dict):
+        yield '{'
+        for i, (key, item) in enumerate(value.items()):
+            yield (', ' if i else '') + json.dumps(str(key)) + ': '
+            yield from iter_json(item)
+        yield '}'
+    elif hasattr(value, '__next__'):
+        yield '['
+        for i, item in enumerate(value):
+            yield (', ' if i else '') + json.dumps(item)
+        yield ']'
+    else:
+        yield json.dumps(value)
+
+
+# ─── Batch Requests ───────────────────────────────────────────
+# POST /api/batch runs several operations through the normal handlers in one
+# request, with their document writes coalesced (storage.batch()) up to the
+# end of each record lock or transaction. Only the CRUD routes of these
+# collections can be batched.
+BATCH_MAX_OPERATIONS = 100
+BATCH_METHODS = ('GET', 'POST', 'PUT', 'DELETE')
+BATCH_PATH_PREFIXES = ('/api/flows', '/api/campaigns', '/api/email-templates', '/api/contact-lists')
+
+def batch_path_allowed(path):
+    path = urlparse(path).path
+    return any(path == p or path.startswith(p + '/') for p in BATCH_PATH_PREFIXES)
+
+def materialize_json(value):
+    """The value with every iterator in it (see iter_json) turned into a list."""
+    if isinstance(value, dict):
+        return {k: materialize_json(v) for k, v in value.items()}
+    if hasattr(value, '__next__'):
+        return list(value)
+    return value
 
 
 # ─── HTTP Handler ───────────────────────────────────────────────
@@ -575,10 +4385,26 @@ class APIHandler(http.server.SimpleHTTPRequestHandler):
         parsed = urlparse(self.path)
         path = parsed.path
 
-        if path == '/api/leads' or path.startswith('/api/leads?'):
+        if path.startswith('/api/track/'):
+            self.handle_tracking_hit(path, parsed.query)
+        elif path == '/api/leads' or path.startswith('/api/leads?'):
             self.proxy_linkedin_api()
+        elif path == '/api/leads/stats':
+            params = parse_qs(parsed.query)
+            bucket = params.get('bucket', ['day'])[0]
+            if bucket not in LEAD_STATS_BUCKETS:
+                self.json_response(400, {'error': f"bucket must be one of {', '.join(LEAD_STATS_BUCKETS)}"})
+                return
+            try:
+                top = max(0, int(params.get('top', [str(LEAD_STATS_TOP)])[0]))
+            except ValueError:
+                self.json_response(400, {'error': 'top must be an integer'})
+                return
+            filters = {col: params[col] for col in LEAD_STATS_DIMENSIONS if col in params}
+            self.json_response(200, lead_stats.stats(
+                filters, params.get('from', [''])[0], params.get('to', [''])[0], bucket, top))
         elif path == '/api/flows':
-            self.json_response(200, {'flows': flows_get_all()})
+            self.json_stream_response(200, {'flows': flows_iter_all()})
         elif path.startswith('/api/flows/'):
             flow_id = path.split('/')[3] if len(path.split('/')) > 3 else ''
             flow = flows_get_by_id(flow_id)
@@ -587,21 +4413,41 @@ class APIHandler(http.server.SimpleHTTPRequestHandler):
             else:
                 self.json_response(404, {'error': 'Flow not found'})
         elif path == '/api/conversations':
-            self.json_response(200, {'conversations': convs_list_all()})
+            self.list_or_delta(parsed.query, 'conversations', 'conversations', convs_list_all, _conv_summary)
+        elif path == '/api/conversations/stream':
+            self.stream_conversation_events(parsed.query)
+        elif path == '/api/conversations/search':
+            params = parse_qs(parsed.query)
+            query = params.get('q', [''])[0].strip()
+            if not query:
+                self.json_response(400, {'error': 'q is required'})
+                return
+            try:
+                offset = max(0, int(params.get('offset', ['0'])[0]))
+                limit = int(params.get('limit', [str(SEARCH_PAGE_SIZE)])[0])
+            except ValueError:
+                self.json_response(400, {'error': 'offset and limit must be integers'})
+                return
+            limit = max(1, min(limit, SEARCH_MAX_PAGE_SIZE))
+            hits, total = message_index.search(query, offset, limit)
+            self.json_response(200, {
+                'hits': hits,
+                'page': {'offset': offset, 'limit': limit, 'total': total, 'hasMore': offset + len(hits) < total}
+            })
+        elif path == '/api/conversations/archive':
+            self.json_response(200, conversation_archive.stats())
         elif path.startswith('/api/conversations/phone/'):
             phone = path.split('/')[4] if len(path.split('/')) > 4 else ''
             conv = convs_get_by_phone(phone)
             if conv:
-                self.json_response(200, {'conversation': conv})
+                self.conversation_page(conv, parsed.query)
             else:
                 self.json_response(404, {'error': 'Conversation not found'})
         elif path.startswith('/api/conversations/lead/'):
             lead_id = path.split('/')[4] if len(path.split('/')) > 4 else ''
-            all_convs = convs_list_all()
-            match = next((c for c in all_convs if c.get('leadId') == lead_id), None)
-            if match:
-                conv = convs_get_by_phone(match['phone'])
-                self.json_response(200, {'conversation': conv})
+            conv = convs_get_by_lead(lead_id)
+            if conv:
+                self.conversation_page(conv, parsed.query)
             else:
                 self.json_response(404, {'error': 'No conversation for this lead'})
         elif path == '/api/webhook':
@@ -621,7 +4467,7 @@ class APIHandler(http.server.SimpleHTTPRequestHandler):
 
         # ─── Email Marketing GET endpoints ─────────────────────
         elif path == '/api/campaigns':
-            self.json_response(200, {'campaigns': campaigns_get_all()})
+            self.list_or_delta(parsed.query, 'campaigns', 'campaigns', campaigns_get_all, _campaign_summary)
         elif path.startswith('/api/campaigns/'):
             campaign_id = path.split('/')[3] if len(path.split('/')) > 3 else ''
             campaign = campaigns_get_by_id(campaign_id)
@@ -639,16 +4485,87 @@ class APIHandler(http.server.SimpleHTTPRequestHandler):
             else:
                 self.json_response(404, {'error': 'Template not found'})
         elif path == '/api/contact-lists':
-            self.json_response(200, {'lists': contactlists_get_all()})
+            self.list_or_delta(parsed.query, 'contact-lists', 'lists', contactlists_get_all, _contactlist_summary)
         elif path.startswith('/api/contact-lists/'):
             list_id = path.split('/')[3] if len(path.split('/')) > 3 else ''
-            contact_list = contactlists_get_by_id(list_id)
-            if contact_list:
-                self.json_response(200, {'list': contact_list})
-            else:
+            contact_list = contactlists_get_meta(list_id)
+            if not contact_list:
                 self.json_response(404, {'error': 'Contact list not found'})
+                return
+            params = parse_qs(parsed.query)
+            if 'offset' in params or 'limit' in params:
+                try:
+                    offset = max(0, int(params.get('offset', ['0'])[0]))
+                    limit = int(params.get('limit', [str(CONTACTLIST_PAGE_SIZE)])[0])
+                except ValueError:
+                    self.json_response(400, {'error': 'offset and limit must be integers'})
+                    return
+                limit = max(1, min(limit, CONTACTLIST_MAX_PAGE_SIZE))
+            else:
+                # Not paged: every contact, streamed, as before pagination existed
+                offset, limit = 0, max(1, contact_list.get('contactCount', 0))
+            query = params.get('q', [''])[0]
+            if query.strip():
+                contacts, total = contactlists_get_page(list_id, offset, limit, query)
+                contacts = iter(contacts)
+            else:
+                # Unfiltered pages go straight from the row stream to the socket
+                contacts = itertools.islice(contactlists_iter_contacts(list_id, offset), limit)
+                total = contact_list.get('contactCount', 0)
+            contact_list['contacts'] = contacts
+            self.json_stream_response(200, {
+                'list': contact_list,
+                'page': {'offset': offset, 'limit': limit, 'total': total, 'hasMore': offset + limit < total}
+            })
         elif path == '/api/email-tracking':
             self.json_response(200, {'stats': tracking_get()})
+        elif path == '/api/broadcasts':
+            self.json_response(200, {'broadcasts': broadcasts_get_all()})
+        elif path.startswith('/api/broadcasts/') and path.endswith('/recipients'):
+            broadcast_id = path.split('/')[3]
+            if not storage.get('broadcasts', broadcast_id):
+                self.json_response(404, {'error': 'Broadcast not found'})
+                return
+            params = parse_qs(parsed.query)
+            try:
+                offset = max(0, int(params.get('offset', ['0'])[0]))
+                limit = int(params.get('limit', [str(BROADCAST_RESULTS_PAGE_SIZE)])[0])
+            except ValueError:
+                self.json_response(400, {'error': 'offset and limit must be integers'})
+                return
+            limit = max(1, min(limit, CONTACTLIST_MAX_PAGE_SIZE))
+            rows, total = broadcasts_results(broadcast_id, offset, limit, params.get('status', [''])[0])
+            self.json_response(200, {
+                'recipients': rows,
+                'page': {'offset': offset, 'limit': limit, 'total': total, 'hasMore': offset + len(rows) < total}
+            })
+        elif path.startswith('/api/broadcasts/'):
+            broadcast = broadcasts_get_by_id(path.split('/')[3])
+            if broadcast:
+                self.json_response(200, {'broadcast': broadcast})
+            else:
+                self.json_response(404, {'error': 'Broadcast not found'})
+        elif path == '/api/messages/outbox':
+            status = parse_qs(parsed.query).get('status', [''])[0]
+            items = list(storage.find('outbox', status=status) if status else storage.list('outbox'))
+            items.sort(key=lambda i: i.get('createdAt', ''))
+            self.json_stream_response(200, {'outbox': iter(items)})
+        elif path == '/api/analytics/messaging':
+            params = parse_qs(parsed.query)
+            granularity = params.get('granularity', ['hour'])[0]
+            if granularity not in ANALYTICS_GRANULARITIES:
+                self.json_response(400, {'error': f"granularity must be one of {', '.join(ANALYTICS_GRANULARITIES)}"})
+                return
+            filters = {dim: params[dim][0] for dim in ANALYTICS_DIMENSIONS if dim in params}
+            self.json_response(200, messaging_stats.query(
+                granularity, params.get('from', [''])[0], params.get('to', [''])[0], filters))
+        elif path.startswith('/api/contacts/import/jobs/'):
+            job_id = path.split('/')[5] if len(path.split('/')) > 5 else ''
+            job = import_jobs_get_by_id(job_id)
+            if job:
+                self.json_response(200, {'job': job})
+            else:
+                self.json_response(404, {'error': 'Import job not found'})
 
         elif path == '/api/whatsapp/config':
             # Return WhatsApp API configuration status (no secrets exposed)
@@ -665,10 +4582,7 @@ class APIHandler(http.server.SimpleHTTPRequestHandler):
         elif path == '/api/whatsapp/message-log':
             # Return recent message send log
             try:
-                logs = []
-                if os.path.exists(MSG_LOG_FILE):
-                    with open(MSG_LOG_FILE) as f:
-                        logs = json.load(f)
+                logs = storage.get_singleton('message-log', [])
                 # Return last 50 entries
                 self.json_response(200, {'logs': logs[-50:]})
             except Exception:
@@ -680,9 +4594,16 @@ class APIHandler(http.server.SimpleHTTPRequestHandler):
     def do_POST(self):
         parsed = urlparse(self.path)
         path = parsed.path
+        if path == '/api/contacts/import/stream':
+            # Reads the body itself, incrementally
+            self.handle_streaming_import(parsed.query)
+            return
         body = self._read_body()
 
-        if path == '/api/flows':
+        if path == '/api/batch':
+            self.handle_batch(body)
+
+        elif path == '/api/flows':
             if not body.get('name'):
                 self.json_response(400, {'error': 'name is required'})
                 return
@@ -721,6 +4642,11 @@ class APIHandler(http.server.SimpleHTTPRequestHandler):
             if not phone or not text:
                 self.json_response(400, {'error': 'phone and text required'})
                 return
+            if body.get('async', WA_SEND_MODE == 'async'):
+                item = outbox.enqueue(phone, text, body.get('leadId'), lead_name, csm_name)
+                self.json_response(202, {'success': True, 'status': 'queued',
+                                         'messageId': item['messageId'], 'outboxId': item['id']})
+                return
             result = wa_send_text(
                 phone, text,
                 lead_name=lead_name,
@@ -779,14 +4705,38 @@ class APIHandler(http.server.SimpleHTTPRequestHandler):
                             'contactName': contact_name
                         })
                     for status in value.get('statuses', []):
-                        conv = convs_get_by_phone(status.get('recipient_id', ''))
-                        if conv:
-                            for m in conv.get('messages', []):
-                                if m.get('waMessageId') == status.get('id'):
-                                    m['status'] = status.get('status', '')
-                            convs_save(conv)
+                        phone, wa_id = status.get('recipient_id', ''), status.get('id')
+                        if convs_update_status(phone, wa_id, status.get('status', '')) is None:
+                            outbox.note_status(phone, wa_id, status.get('status', ''))
+                        messaging_stats.record_status(status)
             self.json_response(200, {'status': 'ok'})
 
+        elif path == '/api/broadcasts':
+            if not body.get('contactListId') or not (body.get('text') or body.get('templateName')):
+                self.json_response(400, {'error': 'contactListId and text or templateName required'})
+                return
+            if not contactlists_get_meta(body['contactListId']):
+                self.json_response(404, {'error': 'Contact list not found'})
+                return
+            broadcast = broadcasts_create(body)
+            if body.get('start'):
+                broadcast = broadcasts_start(broadcast['id'])
+            self.json_response(201, {'broadcast': broadcast})
+
+        elif path.startswith('/api/broadcasts/') and path.rsplit('/', 1)[-1] in ('start', 'pause', 'retry'):
+            parts = path.split('/')
+            broadcast_id, action = parts[3], parts[-1]
+            if not storage.get('broadcasts', broadcast_id):
+                self.json_response(404, {'error': 'Broadcast not found'})
+                return
+            if action == 'pause':
+                if not broadcasts_pause(broadcast_id):
+                    self.json_response(409, {'error': 'Broadcast is not running'})
+                    return
+            else:
+                broadcasts_start(broadcast_id, retry=action == 'retry')
+            self.json_response(200, {'broadcast': broadcasts_get_by_id(broadcast_id)})
+
         # ─── Email Marketing POST endpoints ────────────────────
         elif path == '/api/campaigns':
             if not body.get('name'):
@@ -816,12 +4766,13 @@ class APIHandler(http.server.SimpleHTTPRequestHandler):
             contact_list_id = campaign.get('contactListId')
             sent_count = 0
             if contact_list_id:
-                cl = contactlists_get_by_id(contact_list_id)
+                cl = contactlists_get_meta(contact_list_id)
                 if cl:
-                    sent_count = len(cl.get('contacts', []))
+                    sent_count = cl.get('contactCount', 0)
             campaign['stats']['sent'] = sent_count
             campaigns_save(campaign)
             tracking_update_campaign(campaign_id, campaign['stats'])
+            messaging_stats.record('email', 'sent', sent_count, campaign=campaign_id)
             self.json_response(200, {'campaign': campaign})
 
         elif path == '/api/email-templates':
@@ -852,59 +4803,44 @@ class APIHandler(http.server.SimpleHTTPRequestHandler):
             if not contacts:
                 self.json_response(400, {'error': 'contacts array is required'})
                 return
-            auto_ack = body.get('autoAcknowledge', {})
-            list_name = body.get('listName', 'Imported Contacts')
-            created_leads = []
-            acknowledged_count = 0
-            now = datetime.utcnow().isoformat() + 'Z'
+            dedupe = body.get('dedupe', 'merge')
+            if dedupe not in IMPORT_DEDUPE_POLICIES:
+                self.json_response(400, {'error': f"dedupe must be one of {', '.join(IMPORT_DEDUPE_POLICIES)}"})
+                return
+            job = ContactImportJob(body.get('listName', 'Imported Contacts'),
+                                   body.get('autoAcknowledge', {}), keep_leads=True, dedupe=dedupe)
             for c in contacts:
-                lead_id = 'lead_' + str(int(datetime.utcnow().timestamp() * 1000)) + '_' + uuid.uuid4().hex[:4]
-                lead = {
-                    'id': lead_id,
-                    'name': c.get('name', ''),
-                    'email': c.get('email', ''),
-                    'phone': c.get('phone', ''),
-                    'company': c.get('company', ''),
-                    'jobTitle': c.get('jobTitle', ''),
-                    'location': c.get('location', ''),
-                    'source': c.get('source', 'import'),
-                    'campaign': c.get('campaign', ''),
-                    'status': c.get('status', 'New'),
-                    'priority': c.get('priority', 'Medium'),
-                    'assignedTo': c.get('assignedTo', ''),
-                    'companySize': c.get('companySize', ''),
-                    'industry': c.get('industry', ''),
-                    'seniority': c.get('seniority', ''),
-                    'createdAt': now,
-                    'updatedAt': now
-                }
-                created_leads.append(lead)
-                # Auto-acknowledge via WhatsApp if enabled and phone exists
-                if auto_ack.get('enabled') and lead.get('phone'):
-                    phone = sanitize_phone(lead['phone'])
-                    if phone:
-                        message_text = auto_ack.get('message', 'Hello! Thank you for your interest.')
-                        # Replace placeholders in message
-                        message_text = message_text.replace('{{name}}', lead.get('name', 'there'))
-                        message_text = message_text.replace('{{Name}}', lead.get('name', 'there'))
-                        message_text = message_text.replace('{{company}}', lead.get('company', ''))
-                        message_text = message_text.replace('{{email}}', lead.get('email', ''))
-                        wa_send_text(phone, message_text)
-                        convs_create_or_get(phone, lead_id, lead.get('name', ''))
-                        convs_add_message(phone, {
-                            'direction': 'outgoing',
-                            'type': 'text',
-                            'text': message_text,
-                            'status': 'sent'
-                        })
-                        acknowledged_count += 1
-            # Also create a contact list from the imported contacts
-            contactlists_save({
-                'name': list_name,
-                'description': f'Imported {len(created_leads)} contacts',
-                'contacts': [{'name': l['name'], 'email': l['email'], 'phone': l.get('phone', '')} for l in created_leads]
-            })
-            self.json_response(201, {'leads': created_leads, 'count': len(created_leads), 'acknowledged': acknowledged_count})
+                job.add(c)
+            summary = job.finish()
+            self.json_response(201, {'leads': job.leads, 'count': summary['imported'],
+                                     'new': summary['new'], 'matched': summary['matched'],
+                                     'merged': summary['merged'], 'promoted': summary['promoted'],
+                                     'skipped': summary['skipped'],
+                                     'acknowledged': summary['acknowledged'],
+                                     'failed': summary['failed'], 'errors': summary['errors'],
+                                     'jobId': summary['id'], 'listId': summary['listId']})
+
+        elif path == '/api/contacts/index/rebuild':
+            count = contact_index.rebuild()
+            self.json_response(200, {'success': True, 'keys': count})
+
+        elif path == '/api/conversations/search/rebuild':
+            count = message_index.rebuild()
+            self.json_response(200, {'success': True, 'documents': count})
+
+        elif path == '/api/conversations/archive/run':
+            try:
+                idle_days = float(body.get('idleDays', ARCHIVE_IDLE_DAYS))
+            except (TypeError, ValueError):
+                idle_days = -1
+            if idle_days < 0:
+                self.json_response(400, {'error': 'idleDays must be a non-negative number'})
+                return
+            report = conversation_archive.run(idle_days)
+            if report is None:
+                self.json_response(409, {'error': 'An archive run is already in progress'})
+                return
+            self.json_response(200, {'success': True, 'run': report, 'archive': conversation_archive.stats()})
 
         else:
             self.json_response(404, {'error': 'Not found'})
@@ -949,14 +4885,25 @@ class APIHandler(http.server.SimpleHTTPRequestHandler):
             self.json_response(200, {'template': existing})
 
         elif path.startswith('/api/contact-lists/'):
+            # Accepts metadata fields plus 'add' / 'remove' contact deltas;
+            # a full 'contacts' array still replaces the list's contacts.
             list_id = path.split('/')[3] if len(path.split('/')) > 3 else ''
-            existing = contactlists_get_by_id(list_id)
-            if not existing:
-                self.json_response(404, {'error': 'Contact list not found'})
-                return
-            existing.update(body)
-            existing['id'] = list_id  # prevent ID override
-            contactlists_save(existing)
+            # Held across the metadata save too, or a concurrent delta's
+            # contactCount would be overwritten with the one read here
+            with record_lock('contact-lists', list_id):
+                existing = contactlists_get_meta(list_id)
+                if not existing:
+                    self.json_response(404, {'error': 'Contact list not found'})
+                    return
+                add = body.pop('add', None)
+                remove = body.pop('remove', None)
+                body.pop('contactCount', None)
+                existing.update(body)
+                existing['id'] = list_id  # prevent ID override
+                contactlists_save(existing)
+                if add or remove:
+                    existing = contactlists_apply_delta(list_id, add=add, remove=remove)
+            existing.pop('contacts', None)
             self.json_response(200, {'contactList': existing})
 
         else:
@@ -995,22 +4942,284 @@ class APIHandler(http.server.SimpleHTTPRequestHandler):
             else:
                 self.json_response(404, {'error': 'Contact list not found'})
 
+        elif path.startswith('/api/broadcasts/'):
+            broadcast_id = path.split('/')[3] if len(path.split('/')) > 3 else ''
+            if broadcast_id in _broadcast_runs:
+                self.json_response(409, {'error': 'Pause the broadcast before deleting it'})
+            elif broadcasts_delete(broadcast_id):
+                self.json_response(200, {'success': True})
+            else:
+                self.json_response(404, {'error': 'Broadcast not found'})
+
         else:
             self.json_response(404, {'error': 'Not found'})
 
     def proxy_linkedin_api(self):
         try:
             req = urllib.request.Request(API_URL, headers={'User-Agent': 'SalesDashboard/1.0'})
-            with urllib.request.urlopen(req, timeout=15) as resp:
-                data = resp.read()
-            self.send_response(200)
-            self.send_header('Content-Type', 'application/json')
-            self._cors_headers()
-            self.send_header('Cache-Control', 'no-cache')
-            self.end_headers()
-            self.wfile.write(data)
+            resp = urllib.request.urlopen(req, timeout=15)
         except Exception as e:
             self.json_response(502, {'error': str(e)})
+            return
+        # Pass the upstream body through as it arrives
+        with resp:
+            chunked = self._start_stream(200, 'application/json', [('Cache-Control', 'no-cache')])
+            try:
+                while True:
+                    data = resp.read(STREAM_CHUNK_SIZE)
+                    if not data:
+                        break
+                    self._write_chunk(chunked, data)
+                self._end_stream(chunked)
+            except (BrokenPipeError, ConnectionResetError):
+                return
+            except Exception as e:
+                logger.error(f'LinkedIn proxy stream failed: {e}')
+
+    def handle_streaming_import(self, query):
+        """POST /api/contacts/import/stream — CSV or NDJSON body, parsed as it arrives.
+
+        Query params: listName, format (csv|ndjson, else taken from
+        Content-Type or sniffed), dedupe (merge|update|skip|create), autoAck=1
+        and ackMessage for WhatsApp acknowledgements. Responds with the import
+        job summary only.
+        """
+        params = parse_qs(query)
+        dedupe = params.get('dedupe', ['merge'])[0]
+        if dedupe not in IMPORT_DEDUPE_POLICIES:
+            self.json_response(400, {'error': f"dedupe must be one of {', '.join(IMPORT_DEDUPE_POLICIES)}"})
+            return
+        fmt = params.get('format', [''])[0].lower()
+        content_type = self.headers.get('Content-Type', '').lower()
+        if not fmt:
+            if 'csv' in content_type:
+                fmt = 'csv'
+            elif 'ndjson' in content_type or 'jsonl' in content_type or 'json-seq' in content_type:
+                fmt = 'ndjson'
+        auto_ack = {}
+        if params.get('autoAck', [''])[0] in ('1', 'true'):
+            auto_ack = {'enabled': True}
+            if params.get('ackMessage'):
+                auto_ack['message'] = params['ackMessage'][0]
+        job = ContactImportJob(params.get('listName', ['Imported Contacts'])[0], auto_ack, dedupe=dedupe)
+
+        lines = self._iter_body_lines()
+        try:
+            if not fmt:
+                first = next(lines, '')
+                fmt = 'ndjson' if first.lstrip().startswith('{') else 'csv'
+                lines = _chain_first(first, lines)
+            for row_number, row in iter_import_rows(lines, fmt):
+                if isinstance(row, Exception):
+                    job.reject(row_number, str(row))
+                else:
+                    job.add(row, row_number)
+        except (ValueError, csv.Error) as e:
+            summary = job.finish(status='failed')
+            summary['error'] = str(e)
+            self.json_response(400, {'job': summary})
+            return
+        self.json_response(201, {'job': job.finish()})
+
+    def handle_batch(self, body):
+        """POST /api/batch — {"operations": [{"method", "path", "body", "id"?}, ...]}.
+
+        Operations run in order through the same handlers as separate
+        requests. Their document writes are coalesced, but persisted before a
+        record lock is released or a transaction ends, and the rest once all
+        have run; if that fails the whole request gets a 500. Responds with {"results": [{"status", "body", "id"?}, ...]} in
+        operation order; a failing operation does not stop the others.
+        """
+        operations = body.get('operations') if isinstance(body, dict) else None
+        if not isinstance(operations, list) or not operations:
+            self.json_response(400, {'error': 'operations array is required'})
+            return
+        if len(operations) > BATCH_MAX_OPERATIONS:
+            self.json_response(400, {'error': f'at most {BATCH_MAX_OPERATIONS} operations per batch'})
+            return
+        results = []
+        try:
+            with storage.batch():
+                self._run_batch_operations(operations, results)
+        except Exception as e:
+            # Earlier results may say 200/201 for writes that were not saved
+            logger.error(f'Batch of {len(operations)} operations could not be saved: {e}')
+            self.json_response(500, {'error': f'Batch could not be saved: {e}'})
+            return
+        self.json_response(200, {'results': results})
+
+    def _run_batch_operations(self, operations, results):
+        for op in operations:
+            op = op if isinstance(op, dict) else {}
+            method = str(op.get('method', '')).upper()
+            path = str(op.get('path', ''))
+            if method not in BATCH_METHODS:
+                status, data = 400, {'error': f"method must be one of {', '.join(BATCH_METHODS)}"}
+            elif not batch_path_allowed(path):
+                status, data = 400, {'error': f'{path or "path"} cannot be batched'}
+            else:
+                try:
+                    status, data = BatchCall(self, method, path, op.get('body')).run()
+                except Exception as e:
+                    logger.error(f'Batch operation {method} {path} failed: {e}')
+                    status, data = 500, {'error': str(e)}
+            result = {'status': status, 'body': data}
+            if 'id' in op:
+                result['id'] = op['id']
+            results.append(result)
+
+    def conversation_page(self, conv, query):
+        """Conversation with one page of messages: ?before=<msgId> | ?after=<msgId>, &limit=N."""
+        params = parse_qs(query)
+        before = params.get('before', [''])[0]
+        after = params.get('after', [''])[0]
+        try:
+            limit = int(params.get('limit', [str(CONV_MESSAGES_PAGE_SIZE)])[0])
+        except ValueError:
+            self.json_response(400, {'error': 'limit must be an integer'})
+            return
+        limit = max(1, min(limit, CONV_MESSAGES_MAX_PAGE_SIZE))
+        result = convs_get_messages(conv['phone'], before or None, after or None, limit)
+        if result is None:
+            self.json_response(400, {'error': 'Unknown message cursor'})
+            return
+        messages, has_more = result
+        conv['messages'] = iter(messages)
+        self.json_stream_response(200, {
+            'conversation': conv,
+            'page': {
+                'limit': limit,
+                'total': conv.get('messageCount', 0),
+                'hasMore': has_more,
+                'before': _conv_cursor(messages[0]) if messages else before or None,
+                'after': _conv_cursor(messages[-1]) if messages else after or None
+            }
+        })
+
+    def list_or_delta(self, query, collection, response_key, list_all, summarize):
+        """Full listing, or with ?since=<seq> only the records changed after seq.
+
+        Both forms return 'seq' to pass as `since` on the next call. A delta
+        also returns 'deleted' (keys); 'reset': true means start over with a
+        full listing.
+        """
+        params = parse_qs(query)
+        since = params.get('since', [''])[0]
+        if not since:
+            seq = storage.change_seq()
+            self.json_stream_response(200, {response_key: iter(list_all()), 'seq': seq})
+            return
+        try:
+            since = int(since)
+        except ValueError:
+            self.json_response(400, {'error': 'since must be an integer sequence number'})
+            return
+        delta = changes_since(collection, since, summarize)
+        if delta is None:
+            self.json_response(200, {response_key: [], 'deleted': [], 'seq': storage.change_seq(), 'reset': True})
+            return
+        items, deleted, seq = delta
+        self.json_stream_response(200, {response_key: iter(items), 'deleted': deleted, 'seq': seq})
+
+    def stream_conversation_events(self, query):
+        """GET /api/conversations/stream[?phone=...] — Server-Sent Events.
+
+        Pushes 'message' and 'status' events for one conversation, or for the
+        whole inbox when no phone is given. Resumes from the Last-Event-ID
+        header (or lastEventId query param) and sends a comment heartbeat
+        every SSE_HEARTBEAT_SECONDS.
+        """
+        params = parse_qs(query)
+        phone = sanitize_phone(params.get('phone', [''])[0])
+        last_event_id = self.headers.get('Last-Event-ID') or params.get('lastEventId', [''])[0]
+        after = conv_events.resolve(last_event_id)
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'keep-alive')
+        self.send_header('X-Accel-Buffering', 'no')
+        self._cors_headers()
+        self.end_headers()
+        try:
+            self.wfile.write(b'retry: 3000\n\n')
+            if after is None:
+                # Resume point is gone (restart or buffer overrun): client refetches
+                after = conv_events.seq
+                self.wfile.write(f'id: {conv_events.last_id()}\nevent: reset\ndata: {{}}\n\n'.encode())
+            self.wfile.flush()
+            while True:
+                events, after = conv_events.wait(after, phone or None, timeout=SSE_HEARTBEAT_SECONDS)
+                if events:
+                    chunk = ''.join(
+                        f"id: {e['id']}\nevent: {e['event']}\ndata: {json.dumps(e['data'])}\n\n" for e in events)
+                    self.wfile.write(chunk.encode())
+                else:
+                    self.wfile.write(b': heartbeat\n\n')
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            return
+
+    def handle_tracking_hit(self, path, query):
+        """Serve /api/track/open/{campaignId} and /api/track/click/{campaignId}.
+
+        Hit by every recipient's mail client, so this only bumps in-memory
+        counters and answers immediately; persistence happens in the
+        background flush. Signed links (tracking_url) count and redirect.
+        Unsigned ones, as in mail sent before links were signed, only count,
+        and only for an existing campaign; a click gets a page linking to
+        its target instead of a redirect. A wrong signature gets a 404.
+        """
+        parts = path.split('/')
+        kind = parts[3] if len(parts) > 3 else ''
+        campaign_id = parts[4] if len(parts) > 4 else ''
+        if campaign_id.endswith('.gif'):
+            campaign_id = campaign_id[:-4]
+        params = parse_qs(query)
+        recipient = params.get('r', [''])[0].strip().lower()
+        target = params.get('url', [''])[0] if kind == 'click' else ''
+        signed = 'sig' in params
+        if signed:
+            valid = hmac.compare_digest(params['sig'][0], tracking_signature(campaign_id, recipient, target))
+        else:
+            valid = bool(campaign_id) and storage.get('campaigns', campaign_id) is not None
+        if kind in ('open', 'click') and not valid:
+            # Not a link we issued (see tracking_url): no count, no redirect
+            self.json_response(404, {'error': 'Unknown tracking link'})
+            return
+
+        if kind == 'open' and campaign_id:
+            tracker.record(campaign_id, 'opened', recipient)
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/gif')
+            self.send_header('Content-Length', str(len(TRACKING_PIXEL_GIF)))
+            self.send_header('Cache-Control', 'no-store, no-cache, must-revalidate, max-age=0')
+            self.send_header('Pragma', 'no-cache')
+            self.end_headers()
+            self.wfile.write(TRACKING_PIXEL_GIF)
+        elif kind == 'click' and campaign_id:
+            if urlparse(target).scheme not in ('http', 'https'):
+                self.json_response(400, {'error': 'url must be an http(s) link'})
+                return
+            tracker.record(campaign_id, 'clicked', recipient)
+            if not signed:
+                # The target is unverified, so the recipient follows it themselves
+                page = (f'<!DOCTYPE html><meta charset="utf-8"><title>Continue</title>'
+                        f'<p><a href="{html.escape(target)}">Continue to {html.escape(target)}</a></p>').encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Cache-Control', 'no-store')
+                self.send_header('Content-Length', str(len(page)))
+                self.end_headers()
+                self.wfile.write(page)
+                return
+            self.send_response(302)
+            self.send_header('Location', target)
+            self.send_header('Cache-Control', 'no-store')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        else:
+            self.json_response(404, {'error': 'Not found'})
 
     def json_response(self, code, data):
         self.send_response(code)
@@ -1019,6 +5228,59 @@ class APIHandler(http.server.SimpleHTTPRequestHandler):
         self.end_headers()
         self.wfile.write(json.dumps(data).encode())
 
+    def json_stream_response(self, code, data):
+        """Like json_response, but the body is written as it is serialized
+        (see iter_json), so iterators in data are never held in full."""
+        chunked = self._start_stream(code, 'application/json')
+        buffer, size = [], 0
+        try:
+            for piece in iter_json(data):
+                buffer.append(piece)
+                size += len(piece)
+                if size >= STREAM_CHUNK_SIZE:
+                    self._write_chunk(chunked, ''.join(buffer).encode())
+                    buffer, size = [], 0
+            self._write_chunk(chunked, ''.join(buffer).encode())
+            self._end_stream(chunked)
+        except (BrokenPipeError, ConnectionResetError):
+            return
+        except Exception as e:
+            # Headers are gone already; an unterminated body tells the client it failed
+            logger.error(f'Streaming {self.path} failed: {e}')
+
+    def _start_stream(self, code, content_type, headers=()):
+        """Send headers for a body of unknown length; returns whether it is chunked.
+
+        HTTP/1.1 clients get chunked transfer encoding, HTTP/1.0 clients a
+        body that ends when the connection closes.
+        """
+        chunked = self.request_version == 'HTTP/1.1'
+        if chunked:
+            # Chunked encoding needs an HTTP/1.1 status line
+            self.protocol_version = 'HTTP/1.1'
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        for name, value in headers:
+            self.send_header(name, value)
+        self._cors_headers()
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        return chunked
+
+    def _write_chunk(self, chunked, data):
+        if not data:
+            return
+        if chunked:
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        else:
+            self.wfile.write(data)
+
+    def _end_stream(self, chunked):
+        if chunked:
+            self.wfile.write(b'0\r\n\r\n')
+
     def _cors_headers(self):
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS')
@@ -1033,33 +5295,129 @@ class APIHandler(http.server.SimpleHTTPRequestHandler):
         except Exception:
             return {}
 
+    def _iter_body_chunks(self, chunk_size=65536):
+        """Yield raw request body bytes, honouring chunked transfer encoding."""
+        if 'chunked' in self.headers.get('Transfer-Encoding', '').lower():
+            while True:
+                size_line = self.rfile.readline(65537)
+                if not size_line:
+                    raise ValueError('request body ended before its last chunk')
+                try:
+                    size = int(size_line.split(b';')[0].strip(), 16)
+                except ValueError:
+                    raise ValueError('malformed chunked body')
+                if size == 0:
+                    # Skip optional trailer headers up to the final blank line
+                    while self.rfile.readline(65537) not in (b'\r\n', b'\n', b''):
+                        pass
+                    return
+                remaining = size
+                while remaining:
+                    data = self.rfile.read(min(remaining, chunk_size))
+                    if not data:
+                        raise ValueError('request body ended before its last chunk')
+                    remaining -= len(data)
+                    yield data
+                self.rfile.readline()  # CRLF after each chunk
+        else:
+            remaining = int(self.headers.get('Content-Length', 0) or 0)
+            while remaining > 0:
+                data = self.rfile.read(min(remaining, chunk_size))
+                if not data:
+                    return
+                remaining -= len(data)
+                yield data
+
+    def _iter_body_lines(self):
+        """Yield decoded request body lines (with line endings) as they arrive."""
+        decoder = codecs.getincrementaldecoder('utf-8-sig')(errors='replace')
+        pending = ''
+        for data in self._iter_body_chunks():
+            pending += decoder.decode(data)
+            lines = pending.splitlines(keepends=True)
+            pending = lines.pop() if lines and not lines[-1].endswith(('\n', '\r')) else ''
+            yield from lines
+        pending += decoder.decode(b'', final=True)
+        if pending:
+            yield pending
+
     def end_headers(self):
         if not self._headers_buffer or b'Access-Control-Allow-Origin' not in b''.join(self._headers_buffer):
             self.send_header('Access-Control-Allow-Origin', '*')
         super().end_headers()
 
     def log_message(self, format, *args):
-        # Suppress static file logs, show only API calls
-        if '/api/' in str(args[0]) if args else False:
+        # Suppress static file logs and tracking hits, show only API calls
+        request_line = str(args[0]) if args else ''
+        if '/api/' in request_line and '/api/track/' not in request_line:
             super().log_message(format, *args)
 
 
+class BatchCall(APIHandler):
+    """One operation of a /api/batch request, run through APIHandler's
+    routes with its JSON response captured instead of written to a socket."""
+
+    def __init__(self, parent, method, path, body):
+        data = json.dumps(body).encode() if body is not None else b''
+        self.server = parent.server
+        self.client_address = parent.client_address
+        self.request_version = parent.request_version
+        self.command = method
+        self.path = path
+        self.headers = http.client.HTTPMessage()
+        self.headers['Content-Type'] = 'application/json'
+        self.headers['Content-Length'] = str(len(data))
+        self.rfile = io.BytesIO(data)
+        self.wfile = io.BytesIO()
+        self.result = None
+
+    def run(self):
+        getattr(self, 'do_' + self.command)()
+        return self.result or (500, {'error': 'Operation produced no JSON response'})
+
+    def json_response(self, code, data):
+        self.result = (code, data)
+
+    def json_stream_response(self, code, data):
+        self.result = (code, materialize_json(data))
+
+
 if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'migrate-sqlite':
+        # One-shot copy of the JSON-file data/ tree into the SQLite database
+        print(f'Migrating {DATA_DIR} -> {SQLITE_PATH}')
+        counts = migrate_storage(JsonFileBackend(DATA_DIR), SqliteBackend(SQLITE_PATH))
+        print(f"  {counts['documents']} documents, {counts['rows']} rows, {counts['singletons']} singletons")
+        print('  Start the server with STORAGE_BACKEND=sqlite to use it.')
+        sys.exit(0)
+
     print('=' * 60)
     print('  Sales Dashboard + WhatsApp Marketing Platform')
     print('=' * 60)
-    with http.server.HTTPServer(('', PORT), APIHandler) as httpd:
+    with http.server.ThreadingHTTPServer(('', PORT), APIHandler) as httpd:
         print(f'  Dashboard:        http://localhost:{PORT}')
         print(f'  API proxy:        http://localhost:{PORT}/api/leads')
+        print(f'  Lead Stats:       http://localhost:{PORT}/api/leads/stats')
         print(f'  Webhook:          http://localhost:{PORT}/api/webhook')
+        print(f'  Live Updates:     http://localhost:{PORT}/api/conversations/stream[?phone=...]')
+        print(f'  Message Search:   http://localhost:{PORT}/api/conversations/search?q=...')
+        print(f'  Conv Archive:     http://localhost:{PORT}/api/conversations/archive')
         print(f'  Messages API:     http://localhost:{PORT}/api/messages/send')
+        print(f'  Broadcasts:       http://localhost:{PORT}/api/broadcasts')
         print(f'  WA Config:        http://localhost:{PORT}/api/whatsapp/config')
         print(f'  Message Log:      http://localhost:{PORT}/api/whatsapp/message-log')
         print(f'  Campaigns API:    http://localhost:{PORT}/api/campaigns')
+        print(f'  Batch API:        http://localhost:{PORT}/api/batch')
         print(f'  Templates API:    http://localhost:{PORT}/api/email-templates')
         print(f'  Contact Lists:    http://localhost:{PORT}/api/contact-lists')
         print(f'  Email Tracking:   http://localhost:{PORT}/api/email-tracking')
+        print(f'  Msg Analytics:    http://localhost:{PORT}/api/analytics/messaging?granularity=hour')
+        print(f'  Open Pixel:       http://localhost:{PORT}/api/track/open/<campaignId>?r=<email>&sig=<signature>')
+        print(f'  Click Redirect:   http://localhost:{PORT}/api/track/click/<campaignId>?r=<email>&url=<link>&sig=<signature>')
         print(f'  Contact Import:   http://localhost:{PORT}/api/contacts/import')
+        print(f'  Stream Import:    http://localhost:{PORT}/api/contacts/import/stream')
+        print(f'  Storage:          {storage.name}' + (f' ({SQLITE_PATH})' if storage.name == 'sqlite' else f' ({DATA_DIR})'))
+        print(f'  Workers:          {WORKER_PROCESSES} process' + ('es' if WORKER_PROCESSES > 1 else ''))
         print('=' * 60)
         if WA_ACCESS_TOKEN and WA_PHONE_NUMBER_ID:
             print(f'  ✅ WhatsApp Brand: {WA_BRAND_NAME}')
@@ -1075,4 +5433,21 @@ if __name__ == '__main__':
             print(f'       WHATSAPP_PHONE_NUMBER_ID=your_phone_id_here')
             print(f'     Messages will be simulated until configured.')
         print('=' * 60)
+        if WORKER_PROCESSES > 1:
+            if not hasattr(os, 'fork'):
+                logger.warning('WORKER_PROCESSES needs os.fork(); serving from a single process')
+            else:
+                sys.stdout.flush()
+                # Workers return here (each with the inherited listening socket)
+                slot = run_worker_processes(httpd, WORKER_PROCESSES)
+                logger.info(f'Worker {slot} started (pid {os.getpid()})')
+        tracker.start()
+        messaging_stats.start()
+        outbox.start()
+        broadcasts_resume_interrupted()
+        conversation_archive.start()
+        # Load the search index in the background so the first search is fast
+        threading.Thread(target=message_index.load, daemon=True).start()
+        # Exit through atexit on SIGTERM so write-behind counters get flushed
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
         httpd.serve_forever()